@@ -9,6 +9,7 @@ load_dotenv()
 
 import streamlit as st
 from db.queries import init_db
+from critters.warmup import schedule as schedule_warmup
 
 # ── Page config (must be first Streamlit call) ────────────────────────────────
 st.set_page_config(
@@ -52,6 +53,9 @@ st.markdown("""
 # ── Initialise DB ─────────────────────────────────────────────────────────────
 init_db()
 
+# ── Warm the local model in the background (deduplicated, never blocks) ───────
+schedule_warmup()
+
 # ── Session state defaults ────────────────────────────────────────────────────
 if "page" not in st.session_state:
     st.session_state.page = "home"
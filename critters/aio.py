@@ -0,0 +1,99 @@
+"""
+Smiling Critters — Background Event Loop
+One asyncio loop per process, running on a daemon thread.  Every in-flight
+LLM stream is a task on this loop, so dozens of concurrent replies share one
+thread instead of pinning one each.
+
+Streamlit scripts are synchronous; iterate() is the bridge that lets a
+script thread consume an async iterator one item at a time.  Closing the
+bridge (child left, Streamlit rerun) cancels any pull in progress and closes
+the async iterator on the loop, so upstream HTTP streams stop at once.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Coroutine, Generator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+CLOSE_TIMEOUT_S = 5.0  # max wait for an abandoned stream to shut down
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared engine loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            t = threading.Thread(target=loop.run_forever, name="critters-aio", daemon=True)
+            t.start()
+            _loop = loop
+        return _loop
+
+
+def run(coro: Coroutine[object, object, T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the engine loop and block for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+def submit(coro: Coroutine) -> "asyncio.Future":
+    """Schedule a coroutine on the engine loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def _anext(agen: AsyncIterator[T], pull: Optional[list] = None) -> T:
+    if pull is not None:
+        pull[:] = [asyncio.current_task()]   # lets the closer cancel this pull
+    return await agen.__anext__()
+
+
+async def _shutdown(agen: AsyncIterator, pull: list) -> None:
+    """Cancel an in-progress pull, then close the iterator (runs its finally blocks)."""
+    task = pull[0] if pull else None
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    aclose = getattr(agen, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+def iterate(
+    agen: AsyncIterator[T],
+    on_idle: Optional[Callable[[], None]] = None,
+    idle_interval: float = 0.5,
+) -> Generator[T, None, None]:
+    """Sync adapter: pull items from an async iterator living on the engine loop.
+
+    If the caller stops early (break, close(), garbage collection, or an
+    exception raised by ``on_idle`` such as a Streamlit rerun) the pending
+    pull is cancelled and the async iterator is closed on the loop, so its
+    HTTP stream is released.  While an item is slow to arrive, ``on_idle`` is
+    called on the caller's thread every ``idle_interval`` seconds (e.g. to
+    show a queue position).
+    """
+    loop = get_loop()
+    pull: list = []
+    try:
+        while True:
+            fut = asyncio.run_coroutine_threadsafe(_anext(agen, pull), loop)
+            if on_idle is not None:
+                while not fut.done():
+                    try:
+                        fut.result(idle_interval)
+                    except Exception:
+                        if not fut.done():
+                            on_idle()
+            try:
+                item = fut.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(agen, pull), loop).result(CLOSE_TIMEOUT_S)
+        except Exception:
+            pass
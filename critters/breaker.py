@@ -0,0 +1,174 @@
+"""
+Smiling Critters — Circuit Breakers
+Per-backend failure memory, so a sick backend is skipped instead of costing
+every child a full timeout.
+
+Known design constraints
+------------------------
+- One breaker per backend key: each Ollama endpoint URL, and "gemini".
+- Closed: calls flow and outcomes go into a rolling window of the last
+  WINDOW_S seconds.  A call fails if it raised (5xx, timeout, dropped
+  stream) or if its first token took longer than SLOW_CALL_S.  Once the
+  window holds MIN_CALLS outcomes and the failure share reaches ERROR_RATE,
+  the breaker opens.
+- Open: calls are refused (BreakerOpen) for a cooldown that starts at
+  OPEN_S and doubles after each failed probe, up to MAX_OPEN_S.
+- Half-open: after the cooldown exactly one real request is let through as
+  a probe.  Success closes the breaker with an empty window; failure opens
+  it again.  Other turns keep skipping the backend while the probe runs.
+- Turns the child abandons (closed stream, lost hedge) and turns the
+  scheduler shed are not outcomes; an abandoned probe just frees the probe
+  slot.
+- Gemini 429s stay with the router's rate-limit backoff and are not counted.
+- Outcomes arrive on the engine loop; status is read from Streamlit script
+  threads, so each breaker has its own lock.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Tuple
+
+from critters import telemetry
+
+WINDOW_S     = float(os.getenv("BREAKER_WINDOW_S", "60"))
+MIN_CALLS    = int(os.getenv("BREAKER_MIN_CALLS", "3"))
+ERROR_RATE   = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+SLOW_CALL_S  = float(os.getenv("BREAKER_SLOW_CALL_S", "20"))
+OPEN_S       = float(os.getenv("BREAKER_OPEN_S", "30"))
+MAX_OPEN_S   = float(os.getenv("BREAKER_MAX_OPEN_S", "300"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BreakerOpen(Exception):
+    """The backend's breaker is open; the call was not attempted."""
+
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f"{backend} cooling down for {retry_in:.0f}s")
+        self.backend  = backend
+        self.retry_in = retry_in
+
+
+@dataclass
+class BreakerStatus:
+    state:      str
+    retry_in:   float    # seconds until the next probe is allowed (0 if closed)
+    error_rate: float    # failure share in the current window
+    calls:      int      # outcomes in the current window
+
+
+class CircuitBreaker:
+    def __init__(self, backend: str):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._window: Deque[Tuple[float, bool]] = deque()   # (monotonic, ok)
+        self._open_until = 0.0
+        self._cooldown = OPEN_S
+        self._probing = False
+
+    # ── Call gate ─────────────────────────────────────────────────────────────
+
+    def allow(self) -> bool:
+        """True if a call may go ahead; in half-open, grants the single probe."""
+        with self._lock:
+            self._advance()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def check(self) -> None:
+        """allow(), raising BreakerOpen when the call must be skipped."""
+        if not self.allow():
+            raise BreakerOpen(self.backend, self.status().retry_in)
+
+    def is_usable(self) -> bool:
+        """Would allow() let a call through right now?  Doesn't take the probe."""
+        with self._lock:
+            self._advance()
+            return self._state == CLOSED or (self._state == HALF_OPEN and not self._probing)
+
+    # ── Outcomes ──────────────────────────────────────────────────────────────
+
+    def record(self, ok: bool, first_token_s: float = 0.0) -> None:
+        ok = ok and first_token_s <= SLOW_CALL_S
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN and self._probing:
+                self._probing = False
+                if ok:
+                    self._close()
+                else:
+                    self._trip(now, double=True)
+                return
+            if self._state != CLOSED:
+                return
+            self._window.append((now, ok))
+            self._trim(now)
+            failures = sum(1 for _, good in self._window if not good)
+            if len(self._window) >= MIN_CALLS and failures / len(self._window) >= ERROR_RATE:
+                self._trip(now, double=False)
+
+    def abandon(self) -> None:
+        """A call ended without a verdict (client left, shed) — free the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    # ── Reporting ─────────────────────────────────────────────────────────────
+
+    def status(self) -> BreakerStatus:
+        with self._lock:
+            self._advance()
+            self._trim(time.monotonic())
+            calls = len(self._window)
+            failures = sum(1 for _, good in self._window if not good)
+            return BreakerStatus(
+                state=self._state,
+                retry_in=max(0.0, self._open_until - time.monotonic()) if self._state == OPEN else 0.0,
+                error_rate=failures / calls if calls else 0.0,
+                calls=calls,
+            )
+
+    # ── Internals (lock held) ─────────────────────────────────────────────────
+
+    def _advance(self) -> None:
+        if self._state == OPEN and time.monotonic() >= self._open_until:
+            self._state = HALF_OPEN
+            self._probing = False
+            telemetry.record("breaker", backend=self.backend, state=HALF_OPEN)
+
+    def _trim(self, now: float) -> None:
+        while self._window and self._window[0][0] < now - WINDOW_S:
+            self._window.popleft()
+
+    def _trip(self, now: float, double: bool) -> None:
+        self._cooldown = min(self._cooldown * 2, MAX_OPEN_S) if double else OPEN_S
+        self._state = OPEN
+        self._open_until = now + self._cooldown
+        self._window.clear()
+        telemetry.record("breaker", backend=self.backend, state=OPEN, cooldown_s=self._cooldown)
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._cooldown = OPEN_S
+        self._window.clear()
+        telemetry.record("breaker", backend=self.backend, state=CLOSED)
+
+
+_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get(backend: str) -> CircuitBreaker:
+    """The breaker for ``backend`` (an Ollama URL or "gemini"), created on first use."""
+    with _lock:
+        b = _breakers.get(backend)
+        if b is None:
+            b = _breakers[backend] = CircuitBreaker(backend)
+        return b
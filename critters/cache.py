@@ -0,0 +1,85 @@
+"""
+Smiling Critters — Response Cache
+Replays earlier replies to prompts the child has already sent, skipping the LLM.
+
+Known design constraints
+------------------------
+- The key is (critter, persona-prompt hash, normalised recent context,
+  normalised latest message).  Normalisation lowercases, drops punctuation
+  and emoji and collapses whitespace, so "Hi!!" and "hi" share an entry.
+- Only the last CONTEXT_MESSAGES messages before the latest one count as
+  context — enough to tell a greeting from an answer to "how are you?",
+  short enough that repeated openings still hit.
+- The cache is shared by every session, so a turn is only cached when the
+  whole conversation is inside the key (at most CONTEXT_MESSAGES + 1
+  messages).  A reply generated from a longer history could repeat details
+  from earlier turns to another child whose last messages happen to match.
+- Turns that check_input() flags at any level (distress, personal details,
+  off-limits topics) are never looked up or stored.
+- Entries live in SQLite (db/queries.py) so they survive restarts, with a
+  TTL and an LRU size bound applied on every write.
+- A hit is replayed word by word with a short delay so the chat page's
+  streaming UI looks the same as a live reply.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from typing import AsyncGenerator, Dict, List, Optional
+
+from safety.filters import check_input, FlagLevel
+
+CACHE_TTL_S         = float(os.getenv("LLM_CACHE_TTL_S", str(3 * 24 * 3600)))
+CACHE_MAX_ENTRIES   = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+CONTEXT_MESSAGES    = 2
+REPLAY_TOKEN_DELAY_S = 0.02
+
+_NON_WORD_RE = re.compile(r"[^\w\s']+")
+_SPACE_RE    = re.compile(r"\s+")
+_TOKEN_RE    = re.compile(r"\S+\s*|\s+")
+
+
+def normalise(text: str) -> str:
+    text = _NON_WORD_RE.sub(" ", text.lower()).replace("_", " ")
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(system_prompt: str, messages: List[Dict], critter_id: Optional[str] = None) -> Optional[str]:
+    """Key for the latest user turn, or None if the conversation can't be cached."""
+    if not messages or messages[-1].get("role") != "user" or len(messages) > CONTEXT_MESSAGES + 1:
+        return None
+    latest = normalise(messages[-1].get("content", ""))
+    if not latest or check_input(messages[-1].get("content", "")).level != FlagLevel.SAFE:
+        return None
+    context = [
+        f"{m.get('role')}:{normalise(m.get('content', ''))}"
+        for m in messages[:-1][-CONTEXT_MESSAGES:]
+    ]
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    raw = "\x1f".join([critter_id or "-", prompt_hash, *context, latest])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str) -> Optional[str]:
+    try:
+        from db.queries import get_cached_response
+        return get_cached_response(key, CACHE_TTL_S)
+    except Exception:
+        return None  # cache is best effort — a DB problem is just a miss
+
+
+def store(key: str, critter_id: Optional[str], response: str) -> None:
+    try:
+        from db.queries import put_cached_response
+        put_cached_response(key, critter_id or "", response, CACHE_MAX_ENTRIES, CACHE_TTL_S)
+    except Exception:
+        pass
+
+
+async def replay(text: str, delay: float = REPLAY_TOKEN_DELAY_S) -> AsyncGenerator[str, None]:
+    """Yield a cached reply as a simulated token stream."""
+    for token in _TOKEN_RE.findall(text):
+        yield token
+        if delay:
+            await asyncio.sleep(delay)
@@ -0,0 +1,153 @@
+"""
+Smiling Critters — Offline Replies
+In-character replies that need no model, for when no backend can answer in
+time.
+
+Known design constraints
+------------------------
+- Used by the router as the last tier: Ollama unreachable or cooling,
+  Gemini rate-limited or failing, every queue full, or a cold Ollama model
+  that hasn't produced a first token within LLM_COLD_FALLBACK_S.
+- The child's message is matched against a short, ordered list of intents
+  (feelings first, so a sad child is never answered with a game prompt).
+  Only the first MAX_SCAN_CHARS are scanned, which keeps a reply well
+  inside BUDGET_MS; a slower reply is recorded as over budget.
+- Every template is run through safety.filters.check_output() when this
+  module loads, and any that doesn't pass is dropped, so nothing here
+  reaches the child unvetted.
+- Replies never pretend to answer a question — they stay warm, invite the
+  child to keep going, and suggest asking again in a moment.
+- The same template isn't picked twice in a row for a critter and intent.
+"""
+
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from critters import telemetry
+from safety.filters import check_output, FlagLevel
+
+BUDGET_MS      = 5.0
+MAX_SCAN_CHARS = 400
+
+# Checked in order; the first match wins
+INTENTS: List[Tuple[str, "re.Pattern"]] = [
+    ("sad", re.compile(
+        r"\b(sad|upset|angry|mad|cross|scared|afraid|worried|nervous|lonely|cry|crying|cried|hurt|"
+        r"bad day|not ok|not okay|frustrated|grumpy|tired)\b")),
+    ("happy", re.compile(r"\b(happy|excited|great|awesome|amazing|proud|glad|good day|yay)\b")),
+    ("bye", re.compile(r"\b(bye|goodbye|good night|goodnight|see you|gotta go|have to go)\b")),
+    ("thanks", re.compile(r"\b(thank you|thanks|thank u|thx)\b")),
+    ("hello", re.compile(r"^\W*(hi|hello|hey|hiya|yo|good morning|good afternoon)\b")),
+    ("question", re.compile(r"\?\s*$|^\W*(why|how|what|where|when|who|which|can|could|do|does|is|are|will)\b")),
+]
+
+DEFAULT_TEMPLATES: Dict[str, List[str]] = {
+    "sad": [
+        "Oh friend, that sounds really hard 💜 Your feelings are okay. Can you tell me a little more?",
+        "I'm right here with you 💜 It's okay to feel that way. Would a grown-up hug help too?",
+    ],
+    "happy": [
+        "Yay! That makes me so happy too! 🌟 What was the best part?",
+        "Woohoo! I love that! ✨ Tell me more!",
+    ],
+    "bye": [
+        "Bye bye, friend! 👋 I had so much fun. Come back soon! 🌟",
+        "See you next time! 🌟 You're awesome!",
+    ],
+    "thanks": [
+        "You're so welcome! 🌟 You're a great friend!",
+        "Aww, thank YOU! ✨ What shall we do next?",
+    ],
+    "hello": [
+        "Hi friend! 🌟 I'm so happy you're here! How are you today?",
+        "Hello hello! ✨ What's on your mind today?",
+    ],
+    "question": [
+        "Ooh, what a great question! 🌟 My thinking cap is a bit sleepy — can you ask me again in a moment? What do YOU think?",
+        "Hmm, let me think about that one! ✨ Could you ask me again in a little bit? I'd love to hear your ideas first!",
+    ],
+    "other": [
+        "Ooh, tell me more! 🌟 My thinking cap is a little sleepy, but I'm listening!",
+        "I love chatting with you! ✨ My brain needs a tiny moment — can you say that again soon?",
+    ],
+}
+
+CRITTER_TEMPLATES: Dict[str, Dict[str, List[str]]] = {
+    "bubba": {
+        "question": [
+            "Ooh, a learning question! 🐘✨ My big elephant brain needs a tiny moment. What do you think the first step is?",
+            "One tiny step at a time! 🐘 Can you ask me again in a moment? Tell me what you know so far!",
+        ],
+        "other": ["One tiny step at a time! 🐘✨ My brain is warming up. What are we learning about today?"],
+    },
+    "bobby": {
+        "sad": [
+            "Sending you the biggest bear hug 🐻❤️ Your feelings matter. Can you find a grown-up for a real hug too?",
+            "I hear you, friend 🐻❤️ It's okay to feel that way. I'm right here with you.",
+        ],
+        "other": ["I'm here and I'm listening 🐻❤️ Tell me more whenever you're ready."],
+    },
+    "dogday": {
+        "question": ["Great question, explorer! 🐕 My adventure map is loading. Ask me again in a moment? 🗺️"],
+        "other": ["Ooh, sounds like the start of an adventure! 🐕🗺️ What happens next?"],
+    },
+    "catnap": {
+        "sad": ["Let's take a slow breath together 🐱💜 In... and out. I'm right here."],
+        "other": ["Mmm, that sounds nice 🐱💜 Let's take a slow, calm breath. Tell me more?"],
+    },
+    "kickin": {
+        "question": ["WOW, what a question! 🐔✨ My science brain is warming up! Ask me again in a moment?"],
+        "other": ["Did you know chickens can remember over 100 faces? 🐔✨ What else shall we wonder about?"],
+    },
+    "hoppy": {
+        "question": ["Ooh, hop on that thought! 🐇⚡ Ask me again in a moment — want to do 5 jumps while we wait?"],
+        "other": ["Let's wiggle while my brain warms up! 🐇⚡ Can you hop 3 times? Then tell me more!"],
+    },
+    "piggy": {
+        "question": ["Yummy question! 🐷🍎 My brain is still munching. Ask me again in a moment?"],
+        "other": ["Ooh! 🐷🍎 Did you have a yummy snack today? Tell me about it!"],
+    },
+    "crafty": {
+        "question": ["Ooh, a sparkly question! 🦄🌈 My magic is warming up. Ask me again in a moment?"],
+        "other": ["That sounds magical! 🦄🌈 What colours would you use to draw it?"],
+    },
+}
+
+
+def _vetted(templates: List[str]) -> List[str]:
+    return [t for t in templates if check_output(t).level == FlagLevel.SAFE]
+
+
+DEFAULT_TEMPLATES = {intent: _vetted(ts) for intent, ts in DEFAULT_TEMPLATES.items()}
+CRITTER_TEMPLATES = {
+    cid: {intent: _vetted(ts) for intent, ts in intents.items()}
+    for cid, intents in CRITTER_TEMPLATES.items()
+}
+
+_last_pick: Dict[Tuple[str, str], str] = {}
+
+
+def intent_of(text: str) -> str:
+    """Cheap intent for a child's message: one of INTENTS' names, or "other"."""
+    sample = (text or "")[:MAX_SCAN_CHARS].lower().strip()
+    for name, pattern in INTENTS:
+        if pattern.search(sample):
+            return name
+    return "other"
+
+
+def reply(critter_id: Optional[str], text: str, reason: str) -> str:
+    """An in-character reply to ``text`` for when no model could answer (``reason``)."""
+    started = time.perf_counter()
+    intent  = intent_of(text)
+    choices = CRITTER_TEMPLATES.get(critter_id or "", {}).get(intent) or DEFAULT_TEMPLATES.get(intent) \
+        or DEFAULT_TEMPLATES["other"]
+    last = _last_pick.get((critter_id or "", intent))
+    pick = random.choice([c for c in choices if c != last] or choices)
+    _last_pick[(critter_id or "", intent)] = pick
+    took_ms = (time.perf_counter() - started) * 1000
+    telemetry.record("fallback", critter_id=critter_id, intent=intent, reason=reason,
+                     took_ms=took_ms, over_budget=took_ms > BUDGET_MS)
+    return pick
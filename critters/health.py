@@ -0,0 +1,158 @@
+"""
+Smiling Critters — Backend Health Prober
+A daemon thread that keeps Ollama reachability fresh off the render path.
+
+Known design constraints
+------------------------
+- Readers (router, status badge) never touch the network: is_available()
+  returns the last known state under a lock.  A URL nobody has asked about
+  yet reports None ("unknown") and is probed on the next prober tick.
+- While a backend is up it is re-probed every PROBE_INTERVAL_S.  While it is
+  down the interval doubles on each failure up to PROBE_MAX_BACKOFF_S, so a
+  switched-off box costs one cheap request a minute, not one per rerun.
+- Real traffic is a better probe than the probe request: the router calls report()
+  after each call so a connection failure marks the backend down at once.
+- The probe path comes from the URL's provider (critters.providers), e.g.
+  /api/ps for Ollama, /v1/models for an OpenAI-compatible server.  Ollama's
+  /api/ps also lists the models loaded right now; loaded_models() serves
+  that list while it is fresh (LOADED_FRESH_S), and loaded_now() asks the
+  server directly when a caller can't act on a stale answer.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from critters import providers, transport
+
+PROBE_INTERVAL_S    = float(os.getenv("OLLAMA_PROBE_INTERVAL_S", "5"))
+PROBE_MAX_BACKOFF_S = float(os.getenv("OLLAMA_PROBE_MAX_BACKOFF_S", "60"))
+LOADED_FRESH_S      = 3 * PROBE_INTERVAL_S
+
+
+@dataclass
+class BackendHealth:
+    available:  Optional[bool] = None   # None = never probed
+    checked_at: float = 0.0             # time.monotonic() of last probe/report
+    failures:   int = 0                 # consecutive failures, drives backoff
+    next_probe: float = 0.0
+    loaded:     Optional[FrozenSet[str]] = None   # models in /api/ps; None = not known
+    loaded_at:  float = 0.0
+
+
+class HealthProber:
+    def __init__(self, interval: float = PROBE_INTERVAL_S, max_backoff: float = PROBE_MAX_BACKOFF_S):
+        self.interval    = interval
+        self.max_backoff = max_backoff
+        self._lock    = threading.Lock()
+        self._wake    = threading.Event()
+        self._state: Dict[str, BackendHealth] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Readers (zero latency) ────────────────────────────────────────────────
+
+    def is_available(self, url: str) -> Optional[bool]:
+        """Last known reachability of ``url``; registers it for probing if new."""
+        with self._lock:
+            h = self._state.get(url)
+            if h is None:
+                self._state[url] = BackendHealth()
+        if h is None:
+            self._ensure_running()
+            self._wake.set()
+            return None
+        return h.available
+
+    def snapshot(self, url: str) -> BackendHealth:
+        with self._lock:
+            h = self._state.get(url) or BackendHealth()
+            return BackendHealth(h.available, h.checked_at, h.failures, h.next_probe, h.loaded, h.loaded_at)
+
+    def loaded_models(self, url: str) -> Optional[FrozenSet[str]]:
+        """Models Ollama reported loaded on ``url`` within LOADED_FRESH_S, else None."""
+        with self._lock:
+            h = self._state.get(url)
+            if h is None or h.loaded is None or time.monotonic() - h.loaded_at > LOADED_FRESH_S:
+                return None
+            return h.loaded
+
+    # ── Writers ───────────────────────────────────────────────────────────────
+
+    def report(self, url: str, ok: bool, loaded: Optional[FrozenSet[str]] = None) -> None:
+        """Record an observation from real traffic or a probe."""
+        now = time.monotonic()
+        with self._lock:
+            h = self._state.setdefault(url, BackendHealth())
+            h.available  = ok
+            h.checked_at = now
+            h.failures   = 0 if ok else h.failures + 1
+            h.next_probe = now + self._delay(h.failures)
+            if loaded is not None:
+                h.loaded, h.loaded_at = loaded, now
+
+    def retain(self, urls: Iterable[str]) -> None:
+        """Stop probing URLs no longer in config (e.g. after a dashboard change)."""
+        keep = set(urls)
+        with self._lock:
+            for url in [u for u in self._state if u not in keep]:
+                del self._state[url]
+
+    # ── Prober thread ─────────────────────────────────────────────────────────
+
+    def _delay(self, failures: int) -> float:
+        if failures == 0:
+            return self.interval
+        return min(self.interval * (2 ** failures), self.max_backoff)
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="critters-health", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                due = [u for u, h in self._state.items() if h.next_probe <= now]
+            for url in due:
+                self.report(url, *_probe(url))
+            with self._lock:
+                upcoming = [h.next_probe for h in self._state.values()]
+            sleep_for = (min(upcoming) - time.monotonic()) if upcoming else self.interval
+            self._wake.wait(max(0.05, sleep_for))
+            self._wake.clear()
+
+
+def model_tag(name: str) -> str:
+    """Ollama's full model name: "llama3.2" is "llama3.2:latest"."""
+    return name if ":" in name else f"{name}:latest"
+
+
+def _probe(url: str) -> Tuple[bool, Optional[FrozenSet[str]]]:
+    """Reachability of ``url`` and, on Ollama, the models it has loaded."""
+    provider = providers.for_url(url)
+    try:
+        r = transport.get_session(url).get(f"{url}{provider.probe_path}",
+                                           timeout=transport.PROBE_TIMEOUTS.as_requests())
+        if r.status_code != 200:
+            return False, None
+        if not provider.ollama_native:
+            return True, None
+        return True, frozenset(model_tag(m.get("name") or m.get("model", "")) for m in r.json().get("models", []))
+    except Exception:
+        return False, None
+
+
+def loaded_now(url: str) -> Optional[FrozenSet[str]]:
+    """Ask ``url`` which models are loaded right now (blocking); None if it can't say."""
+    ok, loaded = _probe(url)
+    if ok:
+        prober.report(url, ok, loaded)
+    return loaded
+
+
+prober = HealthProber()
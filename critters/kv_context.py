@@ -0,0 +1,102 @@
+"""
+Smiling Critters — Ollama Conversation State
+Per-session KV-context reuse so each Ollama turn only evaluates new tokens.
+
+Known design constraints
+------------------------
+- Ollama's /api/generate returns a ``context`` (the token ids of the whole
+  conversation so far) when a reply finishes.  Passing it back with only the
+  newest child message lets the runner reuse its KV cache instead of
+  re-evaluating the system prompt and full history.
+- The context is only valid for the exact transcript the model produced.
+  Each state stores a fingerprint of (model, URL, persona prompt, messages
+  including the reply).  Any change — critter switch, model switch, a safety
+  redirect or output-filter replacement, a cached replay, a reply cut short —
+  makes the fingerprint mismatch.
+- Only a session's first turn seeds a context: a lone child message on
+  /api/generate is templated exactly as /api/chat would template it.  A
+  longer history can't be seeded without flattening its turns into one
+  prompt, so a session whose state was invalidated stays on /api/chat, with
+  every turn in its own role, for the rest of the session.
+- The model is pinned with ``keep_alive`` on every call, so the KV cache the
+  context refers to is still resident on the next turn.
+- State is in-process, lock-protected and bounded to MAX_SESSIONS (LRU).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+MAX_SESSIONS      = 256
+
+
+@dataclass
+class ConversationState:
+    model:       str
+    url:         str
+    prompt_hash: str
+    transcript:  str          # fingerprint of messages incl. the last reply
+    context:     List[int]
+
+
+def fingerprint(messages: List[Dict]) -> str:
+    raw = json.dumps([[m.get("role"), m.get("content", "")] for m in messages], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+_lock = threading.Lock()
+_states: "OrderedDict[object, ConversationState]" = OrderedDict()
+
+
+def lookup(session_id, system_prompt: str, messages: List[Dict], url: str, model: str) -> Optional[List[int]]:
+    """Return the reusable context for this turn, or None (and drop stale state)."""
+    if session_id is None or not messages or messages[-1].get("role") != "user":
+        return None
+    with _lock:
+        state = _states.get(session_id)
+        if state is None:
+            return None
+        if (
+            state.model == model
+            and state.url == url
+            and state.prompt_hash == prompt_hash(system_prompt)
+            and state.transcript == fingerprint(messages[:-1])
+            and state.context
+        ):
+            _states.move_to_end(session_id)
+            return state.context
+        del _states[session_id]
+        return None
+
+
+def save(session_id, system_prompt: str, messages: List[Dict], reply: str,
+         url: str, model: str, context: List[int]) -> None:
+    """Record the context returned after a complete reply."""
+    if session_id is None or not context:
+        return
+    state = ConversationState(
+        model=model,
+        url=url,
+        prompt_hash=prompt_hash(system_prompt),
+        transcript=fingerprint(messages + [{"role": "assistant", "content": reply}]),
+        context=context,
+    )
+    with _lock:
+        _states[session_id] = state
+        _states.move_to_end(session_id)
+        while len(_states) > MAX_SESSIONS:
+            _states.popitem(last=False)
+
+
+def invalidate(session_id) -> None:
+    with _lock:
+        _states.pop(session_id, None)
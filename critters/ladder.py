@@ -0,0 +1,143 @@
+"""
+Smiling Critters — Model Ladder
+Steps each Ollama endpoint down to a smaller model when replies get too slow,
+and back up when the box is quieter.
+
+Known design constraints
+------------------------
+- The ladder is ``ollama_model`` followed by ``ollama_model_ladder`` (a
+  comma-separated list, e.g. "llama3.2:3b, llama3.2:1b"), biggest first.
+  With no ladder configured this module always returns ``ollama_model``.
+- The SLO is a first-token latency (``llm_slo_first_token_s``) and a
+  generation speed (``llm_slo_tokens_per_s``).  Each finished Ollama turn is
+  observed per endpoint; once MIN_SAMPLES turns on the current rung fall
+  inside WINDOW_S, a p75 first token above the SLO or a median speed below
+  it steps that endpoint one rung down.
+- Stepping up needs both less load than when we stepped down (other
+  in-flight + queued turns on that box) and first-token headroom (p75 under
+  STEP_UP_HEADROOM × SLO) on the smaller model.  A box too slow even with no
+  other turns therefore stays down until it has been idle for IDLE_RESET_S,
+  which sends it straight back to the top rung.
+- A rung change needs MIN_DWELL_S on the previous rung, so one slow turn
+  can't make the ladder flap.
+- Critters whose generation profile asks for the "fast" tier always get the
+  bottom rung; only turns on the endpoint's current rung feed its samples.
+- configure() is called from the router's config read; observations arrive
+  on the engine loop; the dashboard reads state() from script threads —
+  everything goes through one lock.
+"""
+
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from critters import telemetry
+
+WINDOW_S         = 120.0
+MIN_SAMPLES      = 3
+MIN_DWELL_S      = 60.0
+STEP_UP_HEADROOM = 0.5
+IDLE_RESET_S     = 300.0
+
+
+@dataclass
+class _Rung:
+    level:      int = 0
+    changed_at: float = 0.0
+    last_seen:  float = 0.0
+    down_loads: List[int] = field(default_factory=list)    # load at each step down
+    samples:    Deque[Tuple[float, float, Optional[float]]] = field(default_factory=lambda: deque(maxlen=32))
+
+
+_lock = threading.Lock()
+_models: List[str] = []
+_slo_first_token_s = 3.0
+_slo_tokens_per_s  = 5.0
+_rungs: Dict[str, _Rung] = {}
+
+
+def parse_models(primary: str, extra: str) -> List[str]:
+    models: List[str] = []
+    for m in [primary, *(extra or "").split(",")]:
+        m = m.strip()
+        if m and m not in models:
+            models.append(m)
+    return models
+
+
+def configure(models: List[str], slo_first_token_s: float, slo_tokens_per_s: float) -> None:
+    """Install the current ladder and SLO; a changed ladder resets every endpoint."""
+    global _models, _slo_first_token_s, _slo_tokens_per_s
+    with _lock:
+        if models != _models:
+            _rungs.clear()
+        _models = list(models)
+        _slo_first_token_s = slo_first_token_s
+        _slo_tokens_per_s  = slo_tokens_per_s
+
+
+def select(url: str, tier: str = "full") -> str:
+    """Model the next turn on ``url`` should use.
+
+    ``tier`` comes from the critter's generation profile: "full" follows the
+    ladder, "fast" always takes the smallest model.
+    """
+    now = time.monotonic()
+    with _lock:
+        if not _models:
+            return ""
+        rung = _rungs.setdefault(url, _Rung(changed_at=now, last_seen=now))
+        if rung.level and now - rung.last_seen > IDLE_RESET_S:
+            _move(url, rung, 0, now, "idle")
+        if tier == "fast":
+            return _models[-1]
+        return _models[min(rung.level, len(_models) - 1)]
+
+
+def observe(url: str, model: str, first_token_s: float, tokens_per_s: Optional[float], load: int) -> None:
+    """Feed one finished turn; may move ``url`` one rung down or up."""
+    now = time.monotonic()
+    with _lock:
+        rung = _rungs.setdefault(url, _Rung(changed_at=now))
+        rung.last_seen = now
+        if len(_models) < 2 or model != _models[min(rung.level, len(_models) - 1)]:
+            return
+        rung.samples.append((now, first_token_s, tokens_per_s))
+        recent = [s for s in rung.samples if s[0] >= now - WINDOW_S]
+        if len(recent) < MIN_SAMPLES or now - rung.changed_at < MIN_DWELL_S:
+            return
+        firsts = sorted(s[1] for s in recent)
+        p75    = firsts[min(len(firsts) - 1, int(0.75 * len(firsts)))]
+        speeds = [s[2] for s in recent if s[2]]
+        speed  = statistics.median(speeds) if speeds else None
+        breach = p75 > _slo_first_token_s or (speed is not None and speed < _slo_tokens_per_s)
+
+        if breach and rung.level < len(_models) - 1:
+            rung.down_loads.append(load)
+            _move(url, rung, rung.level + 1, now, "slo_breach", p75=p75, tokens_per_s=speed)
+        elif (not breach and rung.level > 0 and p75 < STEP_UP_HEADROOM * _slo_first_token_s
+              and load < (rung.down_loads[-1] if rung.down_loads else 1)):
+            if rung.down_loads:
+                rung.down_loads.pop()
+            _move(url, rung, rung.level - 1, now, "load_dropped", p75=p75, tokens_per_s=speed)
+
+
+def state(url: str) -> Dict:
+    """Current rung of ``url`` for status panels."""
+    with _lock:
+        rung = _rungs.get(url) or _Rung()
+        level = min(rung.level, max(0, len(_models) - 1))
+        return {"model": _models[level] if _models else "", "rung": level, "rungs": len(_models)}
+
+
+def _move(url: str, rung: _Rung, level: int, now: float, reason: str, **fields) -> None:
+    frm = _models[min(rung.level, len(_models) - 1)]
+    rung.level = level
+    rung.changed_at = now
+    rung.samples.clear()
+    if level == 0:
+        rung.down_loads.clear()
+    telemetry.record("ladder", url=url, from_model=frm, to_model=_models[level], reason=reason, **fields)
@@ -0,0 +1,159 @@
+"""
+Smiling Critters — Ollama Endpoint Pool
+Spreads chat turns over several Ollama boxes listed in ``ollama_url``.
+
+Known design constraints
+------------------------
+- ``ollama_url`` may hold a comma-separated list of base URLs.  A single URL
+  behaves exactly as before.
+- Each endpoint keeps its own in-flight counter and recent throughput here;
+  reachability still comes from critters.health, one prober entry per URL.
+- A turn goes to the healthy endpoint with the fewest in-flight plus queued
+  streams (see critters.scheduler).
+  Sessions stick to the endpoint that served them (so its KV context from
+  critters.kv_context stays valid) unless that endpoint is down or carries
+  more than AFFINITY_SLACK streams above the least-loaded one.
+- Endpoints that have never been probed count as healthy — the first real
+  call tells us soon enough.  An endpoint whose circuit breaker
+  (critters.breaker) is open, or half-open with its probe in flight, is
+  left out.
+- Counters are updated from the engine loop and read by the dashboard from
+  script threads, so all state sits behind one lock.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Tuple
+
+from critters import breaker, health, ladder, scheduler
+
+AFFINITY_SLACK  = 2      # extra in-flight streams tolerated to keep a session's box
+MAX_AFFINITY    = 256    # sessions remembered (LRU)
+THROUGHPUT_TURNS = 20    # recent turns used for the tokens/s figure
+
+
+def parse_urls(raw: str) -> List[str]:
+    """Split a comma-separated ``ollama_url`` value into distinct base URLs."""
+    urls: List[str] = []
+    for part in (raw or "").split(","):
+        url = part.strip().rstrip("/")
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+@dataclass
+class EndpointStats:
+    in_flight: int = 0
+    turns:     int = 0
+    errors:    int = 0
+    recent:    Deque[Tuple[int, float]] = field(default_factory=lambda: deque(maxlen=THROUGHPUT_TURNS))
+
+
+class OllamaPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+        self._affinity: "OrderedDict[object, str]" = OrderedDict()
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+
+    def candidates(self, urls: List[str], session_id=None) -> List[str]:
+        """Healthy endpoints in the order a turn should try them (best first)."""
+        healthy = [u for u in urls
+                   if health.prober.is_available(u) is not False and breaker.get(u).is_usable()]
+        if not healthy:
+            return []
+        queued = {u: scheduler.depth(u) for u in healthy}
+        with self._lock:
+            load = {u: self._stats.setdefault(u, EndpointStats()).in_flight + queued[u] for u in healthy}
+            # Stable sort: ties keep config order, so the first box takes light traffic
+            ordered = sorted(healthy, key=lambda u: load[u])
+            sticky = self._affinity.get(session_id) if session_id is not None else None
+            if sticky in load and load[sticky] <= load[ordered[0]] + AFFINITY_SLACK:
+                ordered.remove(sticky)
+                ordered.insert(0, sticky)
+        return ordered
+
+    def pin(self, session_id, url: str) -> None:
+        """Remember which endpoint served a session."""
+        if session_id is None:
+            return
+        with self._lock:
+            self._affinity[session_id] = url
+            self._affinity.move_to_end(session_id)
+            while len(self._affinity) > MAX_AFFINITY:
+                self._affinity.popitem(last=False)
+
+    # ── Accounting ────────────────────────────────────────────────────────────
+
+    def begin(self, url: str) -> float:
+        with self._lock:
+            self._stats.setdefault(url, EndpointStats()).in_flight += 1
+        return time.monotonic()
+
+    def end(self, url: str, started: float, tokens: int, ok: bool, abandoned: bool = False) -> None:
+        """Close a turn; an ``abandoned`` one (child left) counts neither way."""
+        with self._lock:
+            s = self._stats.setdefault(url, EndpointStats())
+            s.in_flight = max(0, s.in_flight - 1)
+            if abandoned:
+                return
+            if ok:
+                s.turns += 1
+                s.recent.append((tokens, time.monotonic() - started))
+            else:
+                s.errors += 1
+
+    def load(self, url: str) -> int:
+        """In-flight plus queued turns on ``url``."""
+        queued = scheduler.depth(url)
+        with self._lock:
+            s = self._stats.get(url)
+            return (s.in_flight if s else 0) + queued
+
+    def retain(self, urls: List[str]) -> None:
+        """Forget endpoints removed from config."""
+        keep = set(urls)
+        with self._lock:
+            for url in [u for u in self._stats if u not in keep]:
+                del self._stats[url]
+            for sid in [s for s, u in self._affinity.items() if u not in keep]:
+                del self._affinity[sid]
+
+    # ── Reporting ─────────────────────────────────────────────────────────────
+
+    def snapshot(self, urls: List[str]) -> List[Dict]:
+        """Per-endpoint health and load, in config order, for status panels."""
+        rows = []
+        for url in urls:
+            h = health.prober.snapshot(url)
+            b = breaker.get(url).status()
+            rung = ladder.state(url)
+            with self._lock:
+                s = self._stats.get(url) or EndpointStats()
+                tokens  = sum(t for t, _ in s.recent)
+                elapsed = sum(e for _, e in s.recent)
+                sessions = sum(1 for u in self._affinity.values() if u == url)
+                row = {
+                    "url":        url,
+                    "available":  h.available,
+                    "in_flight":  s.in_flight,
+                    "queued":     scheduler.depth(url),
+                    "turns":      s.turns,
+                    "errors":     s.errors,
+                    "sessions":   sessions,
+                    "model":      rung["model"],
+                    "rung":       rung["rung"],
+                    "breaker":    b.state,
+                    "breaker_retry_in": round(b.retry_in),
+                    "error_rate": round(b.error_rate, 2),
+                    "tokens_per_s": round(tokens / elapsed, 1) if elapsed > 0 else None,
+                }
+            rows.append(row)
+        return rows
+
+
+pool = OllamaPool()
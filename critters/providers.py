@@ -0,0 +1,176 @@
+"""
+Smiling Critters — Backend Providers
+Wire format of each streaming backend: request shape, framing, and where the
+tokens and end-of-turn stats sit in a frame.
+
+Known design constraints
+------------------------
+- The router owns everything that isn't wire format — pooling, admission,
+  breakers, ladder, retries — so a new local server only needs a Provider
+  subclass registered in PROVIDERS.  Nothing in get_llm_response() changes.
+- Stream is the reading half (framing, tokens, stats); Provider adds the
+  abstract request() that every local server must build.
+- ``local_provider`` (env LOCAL_LLM_PROVIDER, default "ollama") names the
+  provider for every URL in ``ollama_url``; the router calls configure() on
+  each config read.  The local tier is still reported as backend "ollama".
+- Token extraction reads one string field per frame through
+  critters.streamdecode; a frame is only fully parsed when it carries the
+  turn's final stats.  stats() and is_done() are only asked of frames with
+  no token — in every format here the closing frames carry no text.  Stats
+  are normalised to prompt_eval_count, prompt_eval_s, eval_count, eval_s
+  and (Ollama only) context.
+- KV-context reuse, host tuning (critters.tuning) and warm-up use Ollama's
+  own API, so they only apply to providers with ``ollama_native``.
+- Gemini keeps its request building in the router (retries, 429
+  handling); GEMINI is only a Stream, describing how its SSE is read.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional
+
+from critters import kv_context
+from critters.streamdecode import Frame
+
+
+class Call(NamedTuple):
+    endpoint:  str
+    payload:   Dict
+    token_key: bytes
+
+
+class Stream:
+    name    = ""
+    framing = "ndjson"
+
+    def token(self, frame: Frame, call: Call) -> str:
+        return frame.string(call.token_key) or ""
+
+    def stats(self, frame: Frame) -> Optional[Dict]:
+        """Normalised end-of-turn stats if ``frame`` carries them, else None."""
+        return None
+
+    def is_done(self, frame: Frame) -> bool:
+        return False
+
+
+class Provider(Stream, ABC):
+    probe_path    = ""
+    ollama_native = False
+
+    @abstractmethod
+    def request(self, url: str, model: str, system_prompt: str, messages: List[Dict], options: Dict,
+                context: Optional[List[int]] = None, seed_context: bool = False) -> Call:
+        """The endpoint and payload for one streamed turn."""
+
+
+class OllamaProvider(Provider):
+    """Ollama's /api/chat and /api/generate (NDJSON)."""
+
+    name          = "ollama"
+    probe_path    = "/api/ps"
+    ollama_native = True
+
+    def request(self, url, model, system_prompt, messages, options, context=None, seed_context=False) -> Call:
+        if context is not None or seed_context:
+            payload = {"model": model, "stream": True, "prompt": messages[-1]["content"],
+                       "keep_alive": kv_context.OLLAMA_KEEP_ALIVE, "options": options}
+            if context is not None:
+                payload["context"] = context
+            else:
+                payload["system"] = system_prompt
+            return Call(f"{url}/api/generate", payload, b"response")
+        payload = {
+            "model": model,
+            "stream": True,
+            "messages": [{"role": "system", "content": system_prompt}] + messages,
+            "keep_alive": kv_context.OLLAMA_KEEP_ALIVE,
+            "options": options,
+        }
+        return Call(f"{url}/api/chat", payload, b"content")
+
+    def is_done(self, frame: Frame) -> bool:
+        return frame.contains(b'"done":true') or frame.contains(b'"done": true')
+
+    def stats(self, frame: Frame) -> Optional[Dict]:
+        if not self.is_done(frame):
+            return None
+        data = frame.json()
+        return {
+            "prompt_eval_count": data.get("prompt_eval_count"),
+            "prompt_eval_s":     (data.get("prompt_eval_duration") or 0) / 1e9,
+            "eval_count":        data.get("eval_count"),
+            "eval_s":            (data.get("eval_duration") or 0) / 1e9,
+            "context":           data.get("context"),
+        }
+
+
+class OpenAIProvider(Provider):
+    """OpenAI-compatible /v1/chat/completions (SSE) — llama.cpp server, vLLM, LM Studio."""
+
+    name       = "openai"
+    framing    = "sse"
+    probe_path = "/v1/models"
+
+    def request(self, url, model, system_prompt, messages, options, context=None, seed_context=False) -> Call:
+        payload = {
+            "model": model,
+            "stream": True,
+            "messages": [{"role": "system", "content": system_prompt}] + messages,
+            "temperature": options.get("temperature"),
+            "max_tokens": options.get("num_predict"),
+        }
+        if options.get("stop"):
+            payload["stop"] = options["stop"]
+        return Call(f"{url}/v1/chat/completions", payload, b"content")
+
+    def is_done(self, frame: Frame) -> bool:
+        return frame.equals(b"[DONE]")
+
+    def stats(self, frame: Frame) -> Optional[Dict]:
+        # The chunk with a finish_reason carries llama.cpp's timings and/or usage
+        if not (frame.contains(b'"finish_reason":"') or frame.contains(b'"finish_reason": "')):
+            return None
+        data    = frame.json()
+        timings = data.get("timings") or {}
+        usage   = data.get("usage") or {}
+        return {
+            "prompt_eval_count": timings.get("prompt_n", usage.get("prompt_tokens")),
+            "prompt_eval_s":     (timings.get("prompt_ms") or 0) / 1000,
+            "eval_count":        timings.get("predicted_n", usage.get("completion_tokens")),
+            "eval_s":            (timings.get("predicted_ms") or 0) / 1000,
+            "context":           None,
+        }
+
+
+class GeminiStream(Stream):
+    """Gemini streamGenerateContent?alt=sse — every text part of a chunk is output."""
+
+    name    = "gemini"
+    framing = "sse"
+
+    def token(self, frame: Frame, call: Optional[Call] = None) -> str:
+        return "".join(frame.strings(b"text"))
+
+
+PROVIDERS: Dict[str, Provider] = {p.name: p for p in (OllamaProvider(), OpenAIProvider())}
+OLLAMA = PROVIDERS["ollama"]
+GEMINI = GeminiStream()
+
+_lock = threading.Lock()
+_by_url: Dict[str, Provider] = {}
+
+
+def configure(urls: List[str], name: str) -> None:
+    """Serve every URL in ``urls`` with provider ``name`` (unknown names mean Ollama)."""
+    provider = PROVIDERS.get((name or "").strip().lower(), OLLAMA)
+    with _lock:
+        if len(_by_url) == len(urls) and all(_by_url.get(u) is provider for u in urls):
+            return
+        _by_url.clear()
+        _by_url.update({u: provider for u in urls})
+
+
+def for_url(url: str) -> Provider:
+    with _lock:
+        return _by_url.get(url, OLLAMA)
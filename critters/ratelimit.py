@@ -0,0 +1,80 @@
+"""
+Smiling Critters — Shared Rate Limits
+Cloud request budget shared by every Streamlit process on the host.
+
+Known design constraints
+------------------------
+- State lives in the SQLite ``rate_limits`` table (db/queries.py), so when
+  several server processes run behind a proxy, one 429 pauses all of them
+  and they draw on one token bucket instead of one each.
+- take() is a single BEGIN IMMEDIATE transaction: refill, take a token,
+  report the wait.  SQLite's file lock makes it atomic across processes.
+- The bucket refills at GEMINI_RPM / 60 tokens per second up to GEMINI_BURST.
+  backoff() only ever moves the shared deadline later, so a short
+  Retry-After from one process can't cut short a longer one from another.
+- If the DB is unavailable the same logic runs on in-process state, so the
+  limiter degrades to per-process rather than failing the turn.
+- Calls hit SQLite — async callers should use asyncio.to_thread().
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+GEMINI_RPM   = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "5"))
+
+_LIMITS: Dict[str, Tuple[float, float]] = {
+    "gemini": (GEMINI_RPM / 60.0, GEMINI_BURST),   # name -> (tokens per second, burst)
+}
+
+_lock = threading.Lock()
+_local: Dict[str, list] = {}   # name -> [tokens, refilled_at, backoff_until] — DB fallback
+
+
+def _limits(name: str) -> Tuple[float, float]:
+    return _LIMITS.get(name, (1.0, 1.0))
+
+
+def take(name: str) -> float:
+    """Take one request token for ``name``; 0.0 if granted, else seconds to wait."""
+    rate, burst = _limits(name)
+    try:
+        from db.queries import take_rate_token
+        return take_rate_token(name, rate, burst)
+    except Exception:
+        now = time.time()
+        with _lock:
+            state = _local.setdefault(name, [burst, now, 0.0])
+            if state[2] > now:
+                return state[2] - now
+            state[0] = min(burst, state[0] + (now - state[1]) * rate)
+            state[1] = now
+            if state[0] >= 1.0:
+                state[0] -= 1.0
+                return 0.0
+            return (1.0 - state[0]) / rate
+
+
+def backoff(name: str, seconds: float) -> None:
+    """Pause ``name`` for every process for at least ``seconds``."""
+    until = time.time() + seconds
+    try:
+        from db.queries import set_rate_backoff
+        set_rate_backoff(name, until, _limits(name)[1])
+    except Exception:
+        with _lock:
+            state = _local.setdefault(name, [_limits(name)[1], time.time(), 0.0])
+            state[2] = max(state[2], until)
+
+
+def backoff_remaining(name: str) -> float:
+    """Seconds left on ``name``'s shared backoff (0.0 if none)."""
+    try:
+        from db.queries import get_rate_backoff
+        until = get_rate_backoff(name)
+    except Exception:
+        with _lock:
+            until = _local.get(name, [0, 0, 0.0])[2]
+    return max(0.0, until - time.time())
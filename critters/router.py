@@ -4,43 +4,85 @@ Tries Ollama (local) first, falls back to Gemini (cloud).
 
 Known design constraints
 ------------------------
-- Ollama availability is cached for OLLAMA_CACHE_TTL seconds so the status
-  badge and pre-call reachability check share one network round-trip.
+- Ollama availability comes from the background prober in critters.health;
+  the status badge and the pre-call check read its last known state and
+  never block on the network.
+- ``ollama_url`` may list several endpoints; critters.ollama_pool picks the
+  least-loaded healthy one per turn, sticking to a session's previous box.
+- Every backend call waits for a slot in critters.scheduler first, ordered by
+  the critter's priority class; a backend whose line is full is skipped.
+- Each backend sits behind a circuit breaker (critters.breaker): repeated
+  errors or very slow first tokens open it, and the backend is skipped —
+  shown as "Cooling" — until a single half-open probe succeeds.
+- The Ollama model is chosen per endpoint by critters.ladder, which steps
+  down to smaller models while the latency SLO is breached.
 - PII sanitisation only runs before Gemini (cloud) calls — Ollama is local.
 - If Ollama starts streaming but fails mid-response, we do NOT fall through to
   Gemini (that would produce a garbled double-response).  Instead we append a
   small reconnect nudge and return.
 - check_llm_status() reports Gemini as available only when a key is configured;
   detecting an invalid/expired key would require a live test call.
+- All HTTP goes through critters.transport's pooled keep-alive sessions, so a
+  chat turn reuses the TCP/TLS connection opened by the previous one.
+- Streaming is asyncio-native: aget_llm_response() is the engine and runs on
+  the shared loop in critters.aio; get_llm_response() is the sync adapter the
+  Streamlit pages iterate.
+- ``ollama_url`` endpoints may be any provider in critters.providers (e.g.
+  an OpenAI-compatible llama.cpp server); the wire format and stream
+  decoding live there, the routing rules here are the same for all.
+- Replies are cut once the critter's sentence budget is spent
+  (critters.sentences) inside the backend call itself, so a cut turn still
+  counts as a clean finish everywhere above it.
+- Nested streams are consumed under contextlib.aclosing(), so closing the
+  outer generator unwinds every layer right away and the backend HTTP
+  stream is dropped mid-body — Ollama stops generating for a child who left.
 """
 
 import os
 import json
 import time
-import requests
-from requests.exceptions import HTTPError
+import asyncio
+import threading
+from contextlib import aclosing
 from dotenv import load_dotenv
-from typing import Dict, Generator, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import AsyncGenerator, Callable, Dict, Generator, List, Optional
 
-load_dotenv()  # safety net — also called in app.py
+import httpx
+
+from critters import (
+    aio, breaker, cache, fallback, health, kv_context, ladder, ollama_pool, ratelimit,
+    providers, scheduler, sentences, singleflight, telemetry, transport, tuning, warmup,
+)
+from critters.personas import get_critter, get_profile
+from safety import pii
+from safety.filters import check_output, FlagLevel
 
-GEMINI_MODEL = "gemini-2.0-flash"
+load_dotenv()  # safety net — also called in app.py
 
-# ── Ollama availability cache ─────────────────────────────────────────────────
-# Re-check at most once per TTL window so the status badge + pre-call check
-# share a single HTTP round-trip instead of blocking every render.
-OLLAMA_CACHE_TTL = 5.0   # seconds
-_ollama_cache: Dict = {"available": False, "checked_at": 0.0, "url": ""}
+GEMINI_MODEL    = "gemini-2.0-flash"
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")   # "fast" profile tier
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
 
 # ── Gemini rate-limit backoff ─────────────────────────────────────────────────
-# When a 429 is received, skip Gemini for GEMINI_BACKOFF_S seconds so
-# subsequent messages don't hammer the rate-limit endpoint.
-GEMINI_BACKOFF_S = 60.0  # seconds to wait after a 429 before retrying
+# Every Gemini attempt takes a token from the shared bucket in critters.ratelimit.
+# A 429 pushes the shared backoff deadline out by Retry-After (or
+# GEMINI_BACKOFF_S), pausing Gemini for every server process on the host.
+GEMINI_BACKOFF_S = 60.0  # seconds to wait after a 429 without a Retry-After hint
 GEMINI_MAX_RETRIES = 3   # attempts before giving up
-_gemini_backoff_until: float = 0.0
+GEMINI_ADMIT_WAIT_S = 4.0  # longest a turn sleeps for a token/backoff before giving up
+WAIT_POLL_S = 0.5        # how often a queued turn reports its position to the page
+COLD_FALLBACK_S = float(os.getenv("LLM_COLD_FALLBACK_S", "6"))  # first-token wait on a cold model (0 = off)
+CONTEXT_BLOCK = 6        # history is trimmed this many messages at a time (keeps the prefix stable)
 
+# ── Connection-pool bookkeeping ───────────────────────────────────────────────
+# Remembers the Ollama URLs the pool was built for; a dashboard change retires
+# the old origins' sockets on the next config read.
+_pool_lock = threading.Lock()
+_pooled_ollama_urls: tuple = ()
 
-def _get_config() -> Dict[str, str]:
+
+def _get_config() -> Dict:
     """Read config fresh on every call — DB overrides env."""
     try:
         from db.queries import get_setting
@@ -48,137 +90,506 @@ def _get_config() -> Dict[str, str]:
         ollama_model = get_setting("ollama_model") or os.getenv("OLLAMA_MODEL", "llama3.1:8b")
         db_key       = get_setting("gemini_key")   or ""
         gemini_key   = db_key if (db_key and db_key != "your_gemini_api_key_here") else os.getenv("GEMINI_API_KEY", "")
+        hedge_after  = get_setting("llm_hedge_after_s") or os.getenv("LLM_HEDGE_AFTER_S", "0")
+        use_cache    = get_setting("llm_response_cache") or os.getenv("LLM_RESPONSE_CACHE", "1")
+        model_ladder = get_setting("ollama_model_ladder") or os.getenv("OLLAMA_MODEL_LADDER", "")
+        slo_first    = get_setting("llm_slo_first_token_s") or os.getenv("LLM_SLO_FIRST_TOKEN_S", "3")
+        slo_speed    = get_setting("llm_slo_tokens_per_s") or os.getenv("LLM_SLO_TOKENS_PER_S", "5")
+        tuning_json  = get_setting("ollama_tuning") or ""
+        local_kind   = get_setting("local_provider") or os.getenv("LOCAL_LLM_PROVIDER", "ollama")
     except Exception:
         ollama_url   = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         ollama_model = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
         gemini_key   = os.getenv("GEMINI_API_KEY", "")
-    return {
-        "ollama_url":   ollama_url.rstrip("/"),
-        "ollama_model": ollama_model,
-        "gemini_key":   gemini_key,
+        hedge_after  = os.getenv("LLM_HEDGE_AFTER_S", "0")
+        use_cache    = os.getenv("LLM_RESPONSE_CACHE", "1")
+        model_ladder = os.getenv("OLLAMA_MODEL_LADDER", "")
+        slo_first    = os.getenv("LLM_SLO_FIRST_TOKEN_S", "3")
+        slo_speed    = os.getenv("LLM_SLO_TOKENS_PER_S", "5")
+        tuning_json  = ""
+        local_kind   = os.getenv("LOCAL_LLM_PROVIDER", "ollama")
+    try:
+        hedge_after_s = max(0.0, float(hedge_after))
+    except ValueError:
+        hedge_after_s = 0.0
+    try:
+        slo_first_token_s, slo_tokens_per_s = float(slo_first), float(slo_speed)
+    except ValueError:
+        slo_first_token_s, slo_tokens_per_s = 3.0, 5.0
+    ollama_urls = ollama_pool.parse_urls(ollama_url) or ["http://localhost:11434"]
+    cfg = {
+        "ollama_url":    ollama_urls[0],  # primary endpoint, for single-URL callers
+        "ollama_urls":   ollama_urls,
+        "ollama_model":  ollama_model,
+        "gemini_key":    gemini_key,
+        "hedge_after_s": hedge_after_s,  # 0 = hedging off
+        "response_cache": use_cache == "1",
+        "ollama_models": ladder.parse_models(ollama_model, model_ladder),  # biggest first
     }
+    _sync_pool(ollama_urls)
+    providers.configure(ollama_urls, local_kind)
+    ladder.configure(cfg["ollama_models"], slo_first_token_s, slo_tokens_per_s)
+    tuning.configure(tuning_json)
+    return cfg
+
+
+def _sync_pool(ollama_urls: List[str]) -> None:
+    """Rebuild pooled sessions when the configured Ollama URLs change."""
+    global _pooled_ollama_urls
+    with _pool_lock:
+        if tuple(ollama_urls) == _pooled_ollama_urls:
+            return
+        _pooled_ollama_urls = tuple(ollama_urls)
+    transport.retire_stale(keep=(*ollama_urls, GEMINI_BASE_URL))
+    health.prober.retain(ollama_urls)
+    ollama_pool.pool.retain(ollama_urls)
 
 
 def _sanitise_for_cloud(messages: List[Dict]) -> List[Dict]:
     """Strip PII before sending messages to a cloud API. Not needed for Ollama."""
-    import re
-    safe = []
-    for m in messages:
-        content = m.get("content", "")
-        content = re.sub(r'\b[\w.+-]+@[\w-]+\.\w+\b', '[email removed]', content)
-        content = re.sub(r'\b\d{3}[-.\ s]?\d{3}[-.\ s]?\d{4}\b', '[phone removed]', content)
-        safe.append({**m, "content": content})
-    return safe
-
-
-def _ollama_available(url: str) -> bool:
-    """Cached reachability check — hits the network at most once per OLLAMA_CACHE_TTL."""
-    now = time.monotonic()
-    if (
-        _ollama_cache["url"] == url
-        and now - _ollama_cache["checked_at"] < OLLAMA_CACHE_TTL
-    ):
-        return _ollama_cache["available"]
+    return pii.sanitise_messages(messages)
+
+
+def _ollama_available(url: str) -> Optional[bool]:
+    """Last known reachability from the health prober — never blocks.
+
+    None means the URL has not been probed yet; callers treat it optimistically.
+    """
+    return health.prober.is_available(url)
+
+
+def _gemini_backoff_remaining() -> float:
+    return ratelimit.backoff_remaining("gemini")
+
+
+async def _gemini_admit() -> None:
+    """Take a shared Gemini token, sleeping briefly if one is close; else RATE_LIMITED."""
+    while True:
+        wait = await asyncio.to_thread(ratelimit.take, "gemini")
+        if wait <= 0:
+            return
+        if wait > GEMINI_ADMIT_WAIT_S:
+            raise RuntimeError(f"RATE_LIMITED:{wait:.0f}")
+        await asyncio.sleep(wait)
+
+
+async def _retry_after_s(resp: httpx.Response) -> float:
+    """Server's requested pause: Retry-After (seconds or HTTP date), else the
+    RetryInfo ``retryDelay`` in Gemini's error body, else GEMINI_BACKOFF_S."""
+    header = resp.headers.get("Retry-After", "").strip()
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
     try:
-        r = requests.get(f"{url}/api/tags", timeout=2)
-        result = r.status_code == 200
+        body = json.loads(await resp.aread())
+        for detail in body.get("error", {}).get("details", []):
+            delay = str(detail.get("retryDelay", ""))
+            if delay.endswith("s"):
+                return max(0.0, float(delay[:-1]))
     except Exception:
-        result = False
-    _ollama_cache.update({"available": result, "checked_at": now, "url": url})
-    return result
+        pass
+    return GEMINI_BACKOFF_S
 
 
-def _call_ollama(system_prompt: str, messages: List[Dict], url: str, model: str) -> Generator[str, None, None]:
-    payload = {
-        "model": model,
-        "stream": True,
-        "messages": [{"role": "system", "content": system_prompt}] + messages,
-        "options": {"temperature": 0.7, "num_predict": 300},
-    }
-    with requests.post(f"{url}/api/chat", json=payload, stream=True, timeout=60) as resp:
-        resp.raise_for_status()
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                data  = json.loads(line)
-                token = data.get("message", {}).get("content", "")
-                if token:
-                    yield token
-                if data.get("done"):
-                    break
-            except json.JSONDecodeError:
-                continue
+async def _call_ollama(
+    system_prompt: str,
+    messages: List[Dict],
+    url: str,
+    model: str,
+    session_id=None,
+    profile: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Stream one local reply with the critter's generation ``profile``, in
+    the wire format of the URL's provider (critters.providers).
 
+    On Ollama, a valid per-session KV context (see critters.kv_context)
+    sends only the newest message to /api/generate alongside the previous
+    context, and a session's first turn goes there with the system prompt
+    so a context is seeded.  Any other turn — no session, or a history
+    whose context was invalidated — goes to /api/chat with every turn in
+    its own role.  Ollama calls also carry the host tuning
+    from critters.tuning (threads, batch, per-request num_ctx).
 
-def _call_gemini(system_prompt: str, messages: List[Dict], api_key: str) -> Generator[str, None, None]:
-    global _gemini_backoff_until
+    The reply ends early once the profile's sentence budget is spent; the
+    turn is then reported as finished, with no KV context to save.
+    """
+    provider = providers.for_url(url)
+    profile  = profile or get_profile(None)
+    options  = {"temperature": profile["temperature"], "num_predict": profile["max_tokens"]}
+    if profile.get("stop"):
+        options["stop"] = list(profile["stop"])
+    budget   = sentences.SentenceBudget(profile.get("sentences"))
+    context  = None
+    seeding  = False
+    if provider.ollama_native:
+        context = kv_context.lookup(session_id, system_prompt, messages, url, model)
+        seeding = context is None and session_id is not None and len(messages) == 1
+        # Size num_ctx to this prompt: a reused context already holds its exact token count
+        prompt_tokens = (len(context) + tuning.estimate_tokens("", messages[-1:]) if context is not None
+                         else tuning.estimate_tokens(system_prompt, messages))
+        options.update(tuning.options_for(url, model, prompt_tokens, options["num_predict"]))
+    call = provider.request(url, model, system_prompt, messages, options, context, seeding)
 
-    # Honour backoff window — don't even attempt if we're in cooldown
-    wait = _gemini_backoff_until - time.monotonic()
-    if wait > 0:
-        raise RuntimeError(
-            f"RATE_LIMITED:{wait:.0f}"
-        )
+    timeouts  = transport.DEFAULT_TIMEOUTS
+    client    = transport.get_async_client(url)
+    parts: List[str] = []
+    stats: Dict = {}
+    completed = False
+    abandoned = False
+    first_token_s: Optional[float] = None
+    started   = ollama_pool.pool.begin(url)
+    try:
+        async with client.stream("POST", call.endpoint, json=call.payload, timeout=timeouts.as_httpx()) as resp:
+            resp.raise_for_status()
+            async for frame in transport.aiter_frames_timed(resp, provider.framing, timeouts):
+                token = provider.token(frame, call)
+                if token:
+                    token = budget.clip(token)
+                    if token:
+                        if first_token_s is None:
+                            first_token_s = time.monotonic() - started
+                        parts.append(token)
+                        yield token
+                    if budget.done:
+                        # Leaving the `async with` drops the stream; the server stops generating
+                        completed = True
+                        break
+                    continue
+                # Only token-less frames end a turn or carry its stats
+                stats = provider.stats(frame) or stats
+                if provider.is_done(frame):
+                    completed = True
+                    break
+        if completed:
+            eval_s = stats.get("eval_s") or 0
+            tokens_per_s = stats["eval_count"] / eval_s if eval_s and stats.get("eval_count") else None
+            if budget.done:
+                # No end-of-turn stats on a cut stream: time the frames ourselves (one per token)
+                decode_s = time.monotonic() - started - (first_token_s or 0)
+                tokens_per_s = (len(parts) - 1) / decode_s if len(parts) > 1 and decode_s > 0 else None
+                sentences.record_stop(provider.name, session_id, budget, profile["max_tokens"], "".join(parts))
+                # Only drop the context: no extra request, the next turn goes to /api/chat
+                kv_context.invalidate(session_id)
+            telemetry.record(
+                "ollama_turn",
+                session_id=session_id,
+                url=url,
+                model=model,
+                provider=provider.name,
+                reused_context=context is not None,
+                prompt_eval_count=stats.get("prompt_eval_count"),
+                prompt_eval_s=stats.get("prompt_eval_s") or 0,
+                first_token_s=first_token_s,
+                tokens_per_s=tokens_per_s,
+            )
+            ladder.observe(url, model, first_token_s or (time.monotonic() - started),
+                           tokens_per_s, ollama_pool.pool.load(url) - 1)  # other turns only
+            if stats.get("context"):
+                kv_context.save(session_id, system_prompt, messages, "".join(parts),
+                                url, model, stats["context"])
+    except (GeneratorExit, asyncio.CancelledError):
+        # Child left mid-stream: leaving the `async with` drops the half-read
+        # connection, which is what makes the server stop generating.
+        abandoned = True
+        raise
+    finally:
+        ollama_pool.pool.end(url, started, len(parts), completed, abandoned=abandoned)
+        if completed:
+            ollama_pool.pool.pin(session_id, url)
+            warmup.mark_warm(url, model)
+        else:
+            kv_context.invalidate(session_id)
 
+
+async def _call_gemini(
+    system_prompt: str,
+    messages: List[Dict],
+    api_key: str,
+    profile: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    profile = profile or get_profile(None)
+    model   = _gemini_model(profile)
+    budget  = sentences.SentenceBudget(profile.get("sentences"))
     gemini_messages = []
     for m in messages:
         role = "user" if m["role"] == "user" else "model"
         gemini_messages.append({"role": role, "parts": [{"text": m["content"]}]})
 
-    payload = {
+    endpoint = (
+        f"{GEMINI_BASE_URL}/v1beta/models/"
+        f"{model}:streamGenerateContent?alt=sse&key={api_key}"
+    )
+    timeouts = transport.DEFAULT_TIMEOUTS
+    client   = transport.get_async_client(GEMINI_BASE_URL)
+
+    payload: Dict = {
         "system_instruction": {"parts": [{"text": system_prompt}]},
         "contents": gemini_messages,
-        "generationConfig": {"temperature": 0.7, "maxOutputTokens": 300},
+        "generationConfig": {"temperature": profile["temperature"], "maxOutputTokens": profile["max_tokens"]},
     }
-    endpoint = (
-        f"https://generativelanguage.googleapis.com/v1beta/models/"
-        f"{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={api_key}"
-    )
+    if profile.get("stop"):
+        payload["generationConfig"]["stopSequences"] = list(profile["stop"])
 
     for attempt in range(1, GEMINI_MAX_RETRIES + 1):
+        # Honour the shared backoff window and token bucket before every attempt
+        await _gemini_admit()
         try:
-            with requests.post(endpoint, json=payload, stream=True, timeout=60) as resp:
+            async with client.stream("POST", endpoint, json=payload, timeout=timeouts.as_httpx()) as resp:
                 if resp.status_code == 429:
-                    # Parse Retry-After header if present, else use default backoff
-                    retry_after = float(resp.headers.get("Retry-After", GEMINI_BACKOFF_S))
-                    _gemini_backoff_until = time.monotonic() + retry_after
+                    # Publish the server's pause to every process; a short one is
+                    # slept off by _gemini_admit() on the next attempt
+                    retry_after = await _retry_after_s(resp)
+                    await asyncio.to_thread(ratelimit.backoff, "gemini", retry_after)
                     if attempt < GEMINI_MAX_RETRIES:
-                        time.sleep(min(retry_after, 4.0 * attempt))  # short sleep then retry
                         continue
                     raise RuntimeError(f"RATE_LIMITED:{retry_after:.0f}")
                 resp.raise_for_status()
-                for line in resp.iter_lines():
-                    if not line:
-                        continue
-                    line_str = line.decode("utf-8") if isinstance(line, bytes) else line
-                    if not line_str.startswith("data: "):
-                        continue
-                    try:
-                        data  = json.loads(line_str[6:])
-                        parts = data.get("candidates", [{}])[0].get("content", {}).get("parts", [])
-                        for part in parts:
-                            token = part.get("text", "")
-                            if token:
-                                yield token
-                    except (json.JSONDecodeError, IndexError, KeyError):
-                        continue
+                parts: List[str] = []
+                async for frame in transport.aiter_frames_timed(resp, providers.GEMINI.framing, timeouts):
+                    token = budget.clip(providers.GEMINI.token(frame))
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if budget.done:
+                        sentences.record_stop("gemini", None, budget, profile["max_tokens"], "".join(parts))
+                        break
                 return  # success — exit retry loop
         except RuntimeError:
             raise  # propagate RATE_LIMITED sentinel
         except Exception as e:
             if attempt == GEMINI_MAX_RETRIES:
                 raise
-            time.sleep(2.0 * attempt)
+            await asyncio.sleep(2.0 * attempt)
 
 
-def get_llm_response(
+_RECONNECT_NUDGE = "\n\n*(Oops, my connection went a bit wobbly! Could you ask me that again? 🌟)*"
+
+
+def _is_rate_limited(e: BaseException) -> bool:
+    return isinstance(e, RuntimeError) and str(e).startswith("RATE_LIMITED:")
+
+
+def _unavailable_reason(e: BaseException) -> str:
+    """Why a backend couldn't take the turn, for the offline reply's telemetry."""
+    if isinstance(e, scheduler.QueueFull):
+        return "busy"
+    if isinstance(e, breaker.BreakerOpen):
+        return "cooling"
+    if _is_rate_limited(e):   # RATE_LIMITED sentinel from _call_gemini
+        return "rate_limited"
+    return "error"
+
+
+def _offline_reply(critter_id: Optional[str], messages: List[Dict], reason: str, meta: Dict) -> str:
+    """No backend answered: an instant in-character reply from critters.fallback."""
+    latest = messages[-1].get("content", "") if messages and messages[-1].get("role") == "user" else ""
+    meta.update(backend="fallback", model="fallback")
+    return fallback.reply(critter_id, latest, reason)
+
+
+def _report_ollama_error(url: str, e: BaseException) -> None:
+    if isinstance(e, (httpx.TransportError, asyncio.TimeoutError)):
+        health.prober.report(url, False)
+
+
+async def _admitted(
+    gen: AsyncGenerator[str, None],
+    backend: str,
+    capacity: int,
+    session_id=None,
+    priority: str = "normal",
+) -> AsyncGenerator[str, None]:
+    """
+    Stream ``gen`` once ``backend``'s breaker allows it and the scheduler
+    grants a slot, and report the outcome to the breaker.
+
+    Raises BreakerOpen or QueueFull before the first token when the call
+    can't be made.  Queue wait doesn't count toward first-token latency.
+    """
+    guard = breaker.get(backend)
+    guard.check()
+    admitted: Optional[float] = None
+    first_token_s: Optional[float] = None
+    judged = False
+    try:
+        async with scheduler.slot(backend, capacity, session_id, priority):
+            admitted = time.monotonic()
+            async for token in gen:
+                if first_token_s is None:
+                    first_token_s = time.monotonic() - admitted
+                yield token
+        guard.record(True, first_token_s or 0.0)
+        judged = True
+    except (scheduler.QueueFull, breaker.BreakerOpen):
+        raise
+    except Exception as e:
+        if not _is_rate_limited(e):
+            guard.record(False)
+            judged = True
+        raise
+    finally:
+        if not judged:
+            # Abandoned (child left, hedge lost).  Still a verdict if the
+            # backend had already sat silent past the slow-call limit.
+            if admitted is not None and first_token_s is None \
+                    and time.monotonic() - admitted > breaker.SLOW_CALL_S:
+                guard.record(False)
+            else:
+                guard.abandon()
+        await gen.aclose()
+
+
+def _gemini_model(profile: Dict) -> str:
+    return GEMINI_FAST_MODEL if profile.get("model") == "fast" else GEMINI_MODEL
+
+
+def _fit_context(messages: List[Dict], budget_tokens: int) -> List[Dict]:
+    """
+    Drop the oldest turns until the history fits ``budget_tokens``
+    (estimated at ~4 characters per token).  Cuts fall CONTEXT_BLOCK
+    messages at a time, so the kept prefix stays identical for several turns
+    and Ollama's prompt cache keeps matching it.  The latest message is
+    always kept.
+    """
+    cost  = [len(m.get("content", "")) // 4 + 4 for m in messages]
+    total = sum(cost)
+    start = 0
+    while total > budget_tokens and start + CONTEXT_BLOCK < len(messages):
+        total -= sum(cost[start:start + CONTEXT_BLOCK])
+        start += CONTEXT_BLOCK
+    return messages[start:]
+
+
+def _ollama_stream(system_prompt, messages, url, model, session_id, priority, profile) -> AsyncGenerator[str, None]:
+    return _admitted(_call_ollama(system_prompt, messages, url, model, session_id, profile),
+                     url, scheduler.OLLAMA_CONCURRENCY, session_id, priority)
+
+
+def _gemini_stream(system_prompt, messages, cfg, session_id, priority, profile) -> AsyncGenerator[str, None]:
+    return _admitted(_call_gemini(system_prompt, _sanitise_for_cloud(messages), cfg["gemini_key"], profile),
+                     "gemini", scheduler.GEMINI_CONCURRENCY, session_id, priority)
+
+
+async def _close_racer(task: "asyncio.Future", gen: AsyncGenerator[str, None]) -> None:
+    """Cancel a losing backend: stop its pending read, then close its HTTP stream."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await gen.aclose()
+
+
+async def _hedged_response(
     system_prompt: str,
     messages: List[Dict],
-    use_local: bool = True,
-) -> Generator[str, None, None]:
+    url: str,
+    cfg: Dict,
+    meta: Dict,
+    session_id=None,
+    priority: str = "normal",
+    critter_id: Optional[str] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Race Ollama against a delayed Gemini request for the first token.
+
+    Ollama starts immediately.  If it has not produced a token after
+    cfg["hedge_after_s"] (or fails before then), Gemini starts with
+    PII-sanitised messages.  The first backend to emit a token wins and is
+    streamed alone; the other is cancelled, so the child never sees a
+    spliced response.  Time spent in Ollama's admission queue counts toward
+    the deadline, so a long local line hedges to Gemini.
+    """
+    started = time.monotonic()
+    profile = get_profile(critter_id)
+    model   = ladder.select(url, profile["model"])
+    ollama  = _ollama_stream(system_prompt, messages, url, model, session_id, priority, profile)
+    racers  = {asyncio.ensure_future(anext(ollama)): ("ollama", ollama)}
+    pending = set(racers)
+    errors: Dict[str, BaseException] = {}
+    hedged_at: Optional[float] = None
+    winner = None
+
+    try:
+        while pending and winner is None:
+            timeout = None if hedged_at is not None else max(0.0, started + cfg["hedge_after_s"] - time.monotonic())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, gen = racers[task]
+                exc = task.exception()
+                if exc is None:
+                    winner = (name, gen, task.result())
+                    break
+                errors[name] = exc
+            if winner is None and hedged_at is None and (not done or "ollama" in errors):
+                hedged_at = time.monotonic() - started
+                gemini = _gemini_stream(system_prompt, messages, cfg, session_id, priority, profile)
+                task = asyncio.ensure_future(anext(gemini))
+                racers[task] = ("gemini", gemini)
+                pending.add(task)
+    finally:
+        for task, (name, gen) in racers.items():
+            if winner is None or gen is not winner[1]:
+                await _close_racer(task, gen)
+
+    telemetry.record(
+        "hedge",
+        winner=winner[0] if winner else None,
+        hedged=hedged_at is not None,
+        hedge_after_s=cfg["hedge_after_s"],
+        hedge_started_s=hedged_at,
+        first_token_s=time.monotonic() - started if winner else None,
+    )
+
+    if "ollama" in errors:
+        _report_ollama_error(url, errors["ollama"])
+
+    if winner is None:
+        gemini_exc = errors.get("gemini")
+        if gemini_exc is not None and not isinstance(gemini_exc, StopAsyncIteration):
+            reason = _unavailable_reason(gemini_exc)
+        elif isinstance(errors.get("ollama"), scheduler.QueueFull):
+            reason = "busy"
+        else:
+            reason = "no_backend"
+        yield _offline_reply(critter_id, messages, reason, meta)
+        return
+
+    name, gen, first = winner
+    meta["model"] = model if name == "ollama" else _gemini_model(profile)
+    yield first
+    try:
+        async for token in gen:
+            yield token
+        meta["backend"] = name
+        meta["model"]   = model if name == "ollama" else _gemini_model(profile)
+        if name == "ollama":
+            health.prober.report(url, True)
+    except Exception as e:
+        if name == "ollama":
+            _report_ollama_error(url, e)
+        yield _RECONNECT_NUDGE
+    finally:
+        await gen.aclose()
+
+
+async def _route(
+    system_prompt: str,
+    messages: List[Dict],
+    use_local: bool,
+    cfg: Dict,
+    meta: Dict,
+    session_id=None,
+    priority: str = "normal",
+    critter_id: Optional[str] = None,
+) -> AsyncGenerator[str, None]:
     """
-    Main entry point. Always yields at least one token — never silently empty.
+    Backend routing. Always yields at least one token — never silently empty.
+    On a clean, complete reply meta["backend"] and meta["model"] are set to
+    the serving backend and model.
 
     Fallback rules
     --------------
@@ -187,67 +598,261 @@ def get_llm_response(
        reconnect nudge and return — do NOT start a Gemini response on top of
        a partial Ollama one.
     2. Gemini key set → stream Gemini (with PII sanitisation).
-    3. Both unavailable → friendly error message.
+    3. Both unavailable → an instant in-character offline reply
+       (critters.fallback); meta["backend"] is "fallback".
+
+    With hedging enabled (hedge_after_s > 0) and both backends configured,
+    rules 1–2 become a first-token race — see _hedged_response().
+
+    With several Ollama endpoints, rule 1 tries each healthy one in pool
+    order (least loaded, session's own box first) before falling through.
+
+    Each call first queues for a scheduler slot; an endpoint whose line is
+    full counts as a failure before the first token.  Endpoints whose
+    circuit breaker is open are not tried at all.
+
+    Without a Gemini key, an Ollama model confirmed not loaded
+    (critters.warmup.is_cold) gets COLD_FALLBACK_S for its first token.  If
+    it is still not loaded then, the child gets the offline reply while
+    warm-up keeps the model loading for the next turn.  A model that has
+    loaded by then is generating, so the turn keeps waiting instead.
+
+    The critter's generation profile (critters.personas.get_profile) picks
+    the model tier, reply cap and temperature on both backends, and the
+    history is trimmed to its context budget first.
+
+    Reachability comes from the health prober's last known state.
     """
-    cfg = _get_config()
+    profile   = get_profile(critter_id)
+    messages  = _fit_context(messages, profile["context_tokens"])
+    endpoints = ollama_pool.pool.candidates(cfg["ollama_urls"], session_id) if use_local else []
+
+    if endpoints and cfg["gemini_key"] and cfg["hedge_after_s"] > 0:
+        async with aclosing(_hedged_response(system_prompt, messages, endpoints[0], cfg, meta,
+                                             session_id, priority, critter_id)) as stream:
+            async for token in stream:
+                yield token
+        return
+
+    shed = False
 
     # Try Ollama first (no PII sanitisation needed — fully local)
-    if use_local and _ollama_available(cfg["ollama_url"]):
+    for url in endpoints:
         yielded = False
+        model   = ladder.select(url, profile["model"])
+        meta["model"] = model   # known before the stream ends, for callers that stop early
+        cold_wait = COLD_FALLBACK_S if COLD_FALLBACK_S > 0 and not cfg["gemini_key"] \
+            and providers.for_url(url).ollama_native and warmup.is_cold(url, model) else None
         try:
-            for token in _call_ollama(system_prompt, messages, cfg["ollama_url"], cfg["ollama_model"]):
-                yielded = True
-                yield token
+            async with aclosing(_ollama_stream(system_prompt, messages, url, model, session_id, priority,
+                                               profile)) as stream:
+                if cold_wait is not None:
+                    first = asyncio.ensure_future(anext(stream, None))
+                    done, _ = await asyncio.wait({first}, timeout=cold_wait)
+                    if not done:
+                        loaded = await asyncio.to_thread(health.loaded_now, url) or frozenset()
+                        if health.model_tag(model) in loaded:
+                            # Loaded now, so the answer is being generated: wait however slow it is
+                            done, _ = await asyncio.wait({first})
+                    if not done:
+                        warmup.schedule(critter_id)   # its load request keeps the model coming up
+                        await _close_racer(first, stream)
+                        yield _offline_reply(critter_id, messages, "cold_start", meta)
+                        return
+                    if first.result() is not None:
+                        yielded = True
+                        yield first.result()
+                async for token in stream:
+                    yielded = True
+                    yield token
+            health.prober.report(url, True)
             if yielded:
+                meta["backend"] = "ollama"
+                meta["model"]   = model
                 return
-        except Exception:
+        except Exception as e:
+            _report_ollama_error(url, e)
             if yielded:
                 # Mid-stream failure: don't fall through — a partial Ollama response
                 # followed by a full Gemini response would be garbled and confusing.
-                yield "\n\n*(Oops, my connection went a bit wobbly! Could you ask me that again? 🌟)*"
+                yield _RECONNECT_NUDGE
                 return
-            # No tokens emitted yet → fall through to Gemini
+            # No tokens emitted yet → try the next endpoint, then Gemini
+            shed = shed or isinstance(e, scheduler.QueueFull)
 
     # Try Gemini (sanitise PII before sending to cloud)
     if cfg["gemini_key"]:
-        cloud_msgs = _sanitise_for_cloud(messages)
+        yielded = False
+        meta["model"] = _gemini_model(profile)
         try:
-            yielded = False
-            for token in _call_gemini(system_prompt, cloud_msgs, cfg["gemini_key"]):
-                yielded = True
-                yield token
+            async with aclosing(_gemini_stream(system_prompt, messages, cfg, session_id, priority,
+                                               profile)) as stream:
+                async for token in stream:
+                    yielded = True
+                    yield token
             if yielded:
+                meta["backend"] = "gemini"
+                meta["model"]   = _gemini_model(profile)
                 return
-        except RuntimeError as e:
-            # RATE_LIMITED sentinel from _call_gemini
-            if str(e).startswith("RATE_LIMITED:"):
-                secs = str(e).split(":", 1)[1]
-                yield (
-                    f"Hmm, my cloud brain is a little tired right now 😴 "
-                    f"It needs about {secs} seconds to rest! "
-                    f"Could you try again in a moment? 🌟"
-                )
-                return
-            yield f"Oops, I had a hiccup connecting to my brain! (Error: {str(e)[:80]}) 🌟"
-            return
         except Exception as e:
-            yield f"Oops, I had a hiccup connecting to my brain! (Error: {str(e)[:80]}) 🌟"
+            yield _RECONNECT_NUDGE if yielded else _offline_reply(critter_id, messages, _unavailable_reason(e), meta)
             return
 
-    # Both unavailable
-    yield (
-        "Oh no, I can't think right now! 🌟 "
-        "Ask a grown-up to check the AI settings — "
-        "Ollama needs to be running, or a Gemini key needs to be added in Parent Dashboard."
-    )
+    # Both unavailable (or every local line was full / every local breaker open)
+    if shed:
+        reason = "busy"
+    elif use_local and any(not breaker.get(u).is_usable() for u in cfg["ollama_urls"]):
+        reason = "cooling"
+    else:
+        reason = "no_backend"
+    yield _offline_reply(critter_id, messages, reason, meta)
+
+
+async def aget_llm_response(
+    system_prompt: str,
+    messages: List[Dict],
+    use_local: bool = True,
+    critter_id: Optional[str] = None,
+    session_id=None,
+    meta: Optional[Dict] = None,
+    message_id: Optional[int] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Async streaming engine. Always yields at least one token — never silently empty.
+
+    A repeated prompt (same critter, same recent context, same normalised
+    message) is replayed from the response cache without touching a backend;
+    otherwise the turn goes through _route() and a clean reply that passes
+    the output filter is cached for next time.
+
+    Blocking work (config read, cache I/O) runs in worker threads so the
+    shared engine loop is never stalled.
+
+    Pass a ``meta`` dict to learn who served the turn: after a clean reply it
+    holds "backend" ("ollama", "gemini" or "cache") and "model".  "model"
+    is filled as soon as a backend is tried, so a caller that closes the
+    stream early (e.g. the output safety check) still knows who was writing.
+
+    Closing the generator mid-stream (child left, Streamlit rerun) closes the
+    backend HTTP stream at once and records a "cancelled" telemetry event.
+    A shared turn (below) is kept alive briefly for a rerun to reattach,
+    unless the caller set meta["stop"] = "safety" before closing.
+
+    With a ``session_id`` and the ``message_id`` of the user turn being
+    answered, a duplicate request for the same turn and prompt attaches to
+    the generation already running (critters.singleflight) instead of
+    starting a second one.
+    """
+    meta = meta if meta is not None else {}
+    if session_id is not None and message_id is not None:
+        key = singleflight.flight_key(session_id, message_id, system_prompt, messages)
+        start = lambda m: aget_llm_response(system_prompt, messages, use_local, critter_id, session_id, m)
+        async with aclosing(singleflight.join(key, start, meta)) as stream:
+            async for token in stream:
+                yield token
+        return
+
+    cfg = await asyncio.to_thread(_get_config)
+
+    key = cache.cache_key(system_prompt, messages, critter_id) if cfg["response_cache"] else None
+    if key:
+        hit = await asyncio.to_thread(cache.lookup, key)
+        telemetry.record("cache", hit=hit is not None, critter_id=critter_id)
+        if hit is not None:
+            meta["model"] = "cache"
+            async for token in cache.replay(hit):
+                yield token
+            meta.update(backend="cache", model="cache")
+            return
+
+    priority = get_critter(critter_id).get("priority", "normal") if critter_id else "normal"
+    parts: List[str] = []
+    started = time.monotonic()
+    try:
+        async with aclosing(_route(system_prompt, messages, use_local, cfg, meta, session_id, priority,
+                                   critter_id)) as stream:
+            async for token in stream:
+                parts.append(token)
+                yield token
+    except (GeneratorExit, asyncio.CancelledError):
+        telemetry.record("cancelled", session_id=session_id, critter_id=critter_id,
+                         tokens=len(parts), elapsed_s=time.monotonic() - started)
+        raise
+
+    if key and meta.get("backend") not in (None, "fallback"):
+        reply = "".join(parts)
+        if check_output(reply).level == FlagLevel.SAFE:
+            await asyncio.to_thread(cache.store, key, critter_id, reply)
+
+
+def get_llm_response(
+    system_prompt: str,
+    messages: List[Dict],
+    use_local: bool = True,
+    critter_id: Optional[str] = None,
+    session_id=None,
+    on_wait: Optional[Callable[[scheduler.QueueStatus], None]] = None,
+    meta: Optional[Dict] = None,
+    message_id: Optional[int] = None,
+) -> Generator[str, None, None]:
+    """
+    Main entry point for Streamlit pages — a thin sync adapter over
+    aget_llm_response().  The stream itself runs on the shared engine loop;
+    the calling script thread only waits for the next token.
+
+    While the turn is waiting in the admission queue, ``on_wait`` is called
+    on the calling thread every WAIT_POLL_S with its position and ETA.
+    ``meta`` is filled as in aget_llm_response() once the stream ends, and
+    ``message_id`` enables its single-flight deduplication.
+
+    Callers that may stop early should close() the generator (or iterate it
+    inside try/finally) so the upstream generation is aborted immediately
+    rather than whenever the generator is garbage-collected.
+    """
+    on_idle = None
+    if on_wait is not None and session_id is not None:
+        def on_idle():
+            queued = scheduler.status(session_id)
+            if queued is not None:
+                on_wait(queued)
+
+    yield from aio.iterate(aget_llm_response(system_prompt, messages, use_local, critter_id, session_id, meta,
+                                             message_id),
+                           on_idle=on_idle, idle_interval=WAIT_POLL_S)
+
+
+def get_hedge_stats() -> Dict:
+    """Summary of recent hedged turns, for tuning LLM_HEDGE_AFTER_S."""
+    events  = telemetry.recent("hedge")
+    firsts  = [e["first_token_s"] for e in events if e["first_token_s"] is not None]
+    fired   = [e["hedge_started_s"] for e in events if e["hedge_started_s"] is not None]
+    winners: Dict[str, int] = {}
+    for e in events:
+        winners[e["winner"] or "none"] = winners.get(e["winner"] or "none", 0) + 1
+    return {
+        "turns":            len(events),
+        "hedged":           sum(1 for e in events if e["hedged"]),
+        "hedge_after_s":    events[-1]["hedge_after_s"] if events else None,
+        "hedge_started_p50_s": round(telemetry.percentile(fired, 50), 2),
+        "winners":          winners,
+        "first_token_p50_s": round(telemetry.percentile(firsts, 50), 2),
+        "first_token_p95_s": round(telemetry.percentile(firsts, 95), 2),
+    }
 
 
 def check_llm_status() -> Dict:
     cfg            = _get_config()
-    ollama_ok      = _ollama_available(cfg["ollama_url"])
+    endpoints      = ollama_pool.pool.snapshot(cfg["ollama_urls"])
+    reachable      = [e for e in endpoints if _ollama_available(e["url"])]
+    ollama_ok      = any(e["breaker"] != breaker.OPEN for e in reachable)
+    ollama_cooling = bool(reachable) and not ollama_ok
+    ollama_retry   = min((e["breaker_retry_in"] for e in reachable), default=0)
     gemini_has_key = bool(cfg["gemini_key"]) and cfg["gemini_key"] != "your_gemini_api_key_here"
-    gemini_backoff = time.monotonic() < _gemini_backoff_until
-    gemini_ok      = gemini_has_key and not gemini_backoff
+    backoff_secs   = _gemini_backoff_remaining()
+    gemini_backoff = backoff_secs > 0
+    gemini_breaker = breaker.get("gemini").status()
+    gemini_cooling = gemini_has_key and gemini_breaker.state == breaker.OPEN
+    gemini_ok      = gemini_has_key and not gemini_backoff and not gemini_cooling
 
     if ollama_ok:
         active = "ollama"
@@ -255,14 +860,19 @@ def check_llm_status() -> Dict:
         active = "gemini"
     elif gemini_has_key and gemini_backoff:
         active = "rate_limited"
+    elif ollama_cooling or gemini_cooling:
+        active = "cooling"
     else:
         active = "none"
 
-    backoff_secs = max(0.0, _gemini_backoff_until - time.monotonic())
+    cooling_secs = [t for t, on in ((ollama_retry, ollama_cooling),
+                                    (gemini_breaker.retry_in, gemini_cooling)) if on]
     return {
-        "ollama": {"available": ollama_ok, "model": cfg["ollama_model"], "url": cfg["ollama_url"]},
+        "ollama": {"available": ollama_ok, "model": cfg["ollama_model"], "url": cfg["ollama_url"],
+                   "endpoints": endpoints, "cooling": ollama_cooling},
         "gemini": {"available": gemini_ok, "has_key": gemini_has_key,
                    "rate_limited": gemini_backoff, "backoff_secs": round(backoff_secs),
-                   "model": GEMINI_MODEL},
+                   "cooling": gemini_cooling, "model": GEMINI_MODEL},
         "active": active,
+        "cooling_secs": round(min(cooling_secs, default=0)),
     }
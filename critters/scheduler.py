@@ -0,0 +1,201 @@
+"""
+Smiling Critters — Generation Scheduler
+Bounded admission queue in front of every backend call.
+
+Known design constraints
+------------------------
+- Each backend (every Ollama endpoint URL, and "gemini") has its own
+  concurrency limit: OLLAMA_CONCURRENCY streams per Ollama box (CPU boxes
+  slow down for everyone past a couple of parallel generations) and
+  GEMINI_CONCURRENCY for the cloud.
+- Waiting turns are served by priority class first, then round-robin across
+  sessions, so one chatty session can't starve the others.  Classes come from
+  the persona's ``priority`` field: emotional-support critters ("support")
+  go before ordinary ones, game turns ("play") go last.
+- At most MAX_QUEUE turns wait per backend.  A new turn beyond that displaces
+  the youngest waiter of a lower class, or is shed with QueueFull — the
+  router then tries another backend or tells the child it's busy.
+- Slots are taken and released on the engine loop (critters.aio).  The lock
+  only exists so status() can be read from Streamlit script threads.
+- ETA is the waiter's position times the recent mean slot hold time, divided
+  by the backend's concurrency.  It is a rough guide for the "thinking" UI,
+  not a promise.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from critters import telemetry
+
+OLLAMA_CONCURRENCY = int(os.getenv("LLM_OLLAMA_CONCURRENCY", "2"))
+GEMINI_CONCURRENCY = int(os.getenv("LLM_GEMINI_CONCURRENCY", "8"))
+MAX_QUEUE          = int(os.getenv("LLM_MAX_QUEUE", "12"))
+DEFAULT_TURN_S     = 8.0    # assumed slot hold time before any turn has finished
+
+PRIORITY_RANK = {"support": 0, "normal": 1, "play": 2}
+
+
+class QueueFull(Exception):
+    """The backend's waiting line is full; the turn was not admitted."""
+
+
+@dataclass
+class QueueStatus:
+    backend:  str
+    position: int      # turns ahead of this one (0 = next in line)
+    eta_s:    float
+
+
+@dataclass
+class _Waiter:
+    session_id: object
+    rank:       int
+    future:     "asyncio.Future"
+    enqueued:   float
+
+
+class _Gate:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active   = 0
+        self.lines: Dict[int, "OrderedDict[object, Deque[_Waiter]]"] = {}
+        self.holds: Deque[float] = deque(maxlen=20)
+
+    def order(self) -> List[_Waiter]:
+        """Waiters in the order they will be admitted."""
+        out: List[_Waiter] = []
+        for rank in sorted(self.lines):
+            queues = [list(q) for q in self.lines[rank].values()]
+            for i in range(max((len(q) for q in queues), default=0)):
+                out.extend(q[i] for q in queues if i < len(q))
+        return out
+
+    def depth(self) -> int:
+        return sum(len(q) for line in self.lines.values() for q in line.values())
+
+    def push(self, w: _Waiter) -> None:
+        self.lines.setdefault(w.rank, OrderedDict()).setdefault(w.session_id, deque()).append(w)
+
+    def pop(self) -> Optional[_Waiter]:
+        for rank in sorted(self.lines):
+            line = self.lines[rank]
+            if not line:
+                continue
+            sid, q = next(iter(line.items()))
+            w = q.popleft()
+            if q:
+                line.move_to_end(sid)   # round-robin: this session goes to the back
+            else:
+                del line[sid]
+            return w
+        return None
+
+    def remove(self, w: _Waiter) -> None:
+        line = self.lines.get(w.rank, {})
+        q = line.get(w.session_id)
+        if q is not None and w in q:
+            q.remove(w)
+            if not q:
+                del line[w.session_id]
+
+    def mean_hold(self) -> float:
+        return sum(self.holds) / len(self.holds) if self.holds else DEFAULT_TURN_S
+
+
+_lock  = threading.Lock()
+_gates: Dict[str, _Gate] = {}
+
+
+def _dispatch(gate: _Gate) -> None:
+    while gate.active < gate.capacity:
+        w = gate.pop()
+        if w is None:
+            return
+        if w.future.done():
+            continue
+        gate.active += 1
+        w.future.set_result(None)
+
+
+def _shed_for(gate: _Gate, rank: int) -> bool:
+    """Drop the youngest waiter of a class below ``rank``; True if one was dropped."""
+    victims = [w for w in gate.order() if w.rank > rank]
+    if not victims:
+        return False
+    victim = max(victims, key=lambda w: (w.rank, w.enqueued))
+    gate.remove(victim)
+    victim.future.set_exception(QueueFull("displaced by a higher-priority turn"))
+    return True
+
+
+@asynccontextmanager
+async def slot(backend: str, capacity: int, session_id=None, priority: str = "normal"):
+    """Hold one of ``backend``'s generation slots for the duration of the block."""
+    rank   = PRIORITY_RANK.get(priority, PRIORITY_RANK["normal"])
+    queued = time.monotonic()
+    waiter = None
+    with _lock:
+        gate = _gates.setdefault(backend, _Gate(capacity))
+        gate.capacity = max(1, capacity)
+        if gate.active < gate.capacity and gate.depth() == 0:
+            gate.active += 1
+        else:
+            if gate.depth() >= MAX_QUEUE and not _shed_for(gate, rank):
+                telemetry.record("queue", backend=backend, priority=priority, shed=True, waited_s=0.0)
+                raise QueueFull(f"{backend} queue is full")
+            waiter = _Waiter(session_id, rank, asyncio.get_running_loop().create_future(), queued)
+            gate.push(waiter)
+
+    if waiter is not None:
+        try:
+            await waiter.future
+        except QueueFull:
+            telemetry.record("queue", backend=backend, priority=priority, shed=True,
+                             waited_s=time.monotonic() - queued)
+            raise
+        except BaseException:
+            # Cancelled while waiting (child left, hedge lost): give back a slot
+            # that was handed over in the meantime, otherwise leave the line.
+            with _lock:
+                if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                    gate.active -= 1
+                    _dispatch(gate)
+                else:
+                    gate.remove(waiter)
+            raise
+
+    admitted = time.monotonic()
+    telemetry.record("queue", backend=backend, priority=priority, shed=False, waited_s=admitted - queued)
+    try:
+        yield
+    finally:
+        with _lock:
+            gate.holds.append(time.monotonic() - admitted)
+            gate.active -= 1
+            _dispatch(gate)
+
+
+def depth(backend: str) -> int:
+    """Turns currently waiting for ``backend``."""
+    with _lock:
+        gate = _gates.get(backend)
+        return gate.depth() if gate else 0
+
+
+def status(session_id) -> Optional[QueueStatus]:
+    """Where this session's waiting turn stands, or None if it isn't queued."""
+    if session_id is None:
+        return None
+    with _lock:
+        for backend, gate in _gates.items():
+            for pos, w in enumerate(gate.order()):
+                if w.session_id == session_id:
+                    eta = (pos + 1) * gate.mean_hold() / gate.capacity
+                    return QueueStatus(backend=backend, position=pos, eta_s=eta)
+    return None
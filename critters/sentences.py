@@ -0,0 +1,88 @@
+"""
+Smiling Critters — Sentence Budget
+Ends a streamed reply once the critter has said as many sentences as its
+persona allows.
+
+Known design constraints
+------------------------
+- Every persona asks for a few short sentences, but models ramble past that
+  until ``num_predict`` runs out.  The budget is the profile's ``sentences``
+  (critters.personas); 0 or None turns it off for that critter.
+- A sentence is counted when ., !, ? or … is followed by whitespace and then
+  the first letter or digit of the next sentence.  The stream is cut just
+  before that letter, so trailing emoji, closing quotes and markdown after
+  the last sentence (``fun! 🐘``) are kept.  The price is reading one token
+  past the budget.
+- Counting errs towards too few sentences, never too many: a full stop
+  after a number ("1. Apples"), a single letter ("e.g.") or a common
+  abbreviation ("Mr.") doesn't count, and text without end punctuation never
+  stops.
+- The backend call that owns the HTTP stream (critters.router) applies the
+  budget and leaves its ``async with``, which is what makes the server stop
+  generating.  The turn still counts as finished for the breaker, pool and
+  ladder.  Ollama returns no KV context for a cut reply; the session's
+  state is dropped and nothing else is sent, so the next turn goes to
+  /api/chat with the trimmed history (critters.kv_context).
+- Profile ``stop`` sequences go to the backend as well (Ollama ``stop``,
+  OpenAI-compatible ``stop``, Gemini ``stopSequences``).  The server then
+  ends the turn itself when the model starts writing the child's side of
+  the conversation.
+- Each cut records a "sentence_stop" telemetry event.  Token counts are
+  estimated at ~4 characters per token.  ``tokens_saved`` is measured
+  against the reply cap, so it is the most the cut could have saved.
+"""
+
+from typing import Optional
+
+from critters import telemetry
+
+_ENDS = ".!?…"
+_ABBREVIATIONS = frozenset({"mr", "mrs", "ms", "mx", "dr", "st", "mt", "vs", "etc", "no"})
+
+
+class SentenceBudget:
+    """Feed each streamed token through clip(); stop reading once ``done``."""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit   = limit or 0
+        self.count   = 0            # sentences completed so far
+        self.done    = False
+        self._word   = ""           # letters/digits of the current word
+        self._ended  = False        # end punctuation seen, next sentence not started
+        self._gap    = False        # ... and whitespace after it
+
+    def clip(self, token: str) -> str:
+        """The part of ``token`` within the budget; sets ``done`` when it runs out."""
+        if self.done:
+            return ""
+        if not self.limit:
+            return token
+        for i, ch in enumerate(token):
+            if ch.isalnum():
+                if self._gap:
+                    self.count += 1
+                    if self.count >= self.limit:
+                        self.done = True
+                        return token[:i].rstrip()
+                self._ended = self._gap = False
+                self._word += ch
+            elif ch in _ENDS:
+                word = self._word
+                if word and not (word.isdigit() or len(word) == 1 or word.lower() in _ABBREVIATIONS):
+                    self._ended = True
+                self._word = ""
+            elif ch.isspace():
+                self._gap = self._ended
+                self._word = ""
+            elif ch in "'’":
+                self._word += ch        # "don't." is a sentence, not the letter "t"
+            else:
+                self._word = ""         # emoji, quotes, brackets, markdown
+        return token
+
+
+def record_stop(backend: str, session_id, budget: SentenceBudget, max_tokens: int, reply: str) -> None:
+    """Log a budget cut and roughly how much generation it spared."""
+    tokens = max(1, len(reply) // 4)
+    telemetry.record("sentence_stop", backend=backend, session_id=session_id, sentences=budget.count,
+                     tokens=tokens, tokens_saved=max(0, max_tokens - tokens))
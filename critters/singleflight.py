@@ -0,0 +1,155 @@
+"""
+Smiling Critters — Single-Flight Generations
+One backend generation per chat turn, however many times the page asks.
+
+Known design constraints
+------------------------
+- Streamlit reruns, a double-tapped feelings-wheel button or a replayed
+  voice message can run the same turn twice.  Turns are keyed on (session,
+  user message id, prompt hash); a caller with the key of a generation
+  already in flight attaches to it instead of starting another.
+- Each flight buffers every token it has produced.  A late caller first gets
+  the tokens already emitted, then follows the live stream, so its reply
+  is identical to the first caller's.
+- The generation belongs to the flight, not to a caller.  When the last
+  caller leaves, the flight waits GRACE_S for a rerun to reattach before
+  it is cancelled, which closes the backend stream (see the router's
+  cancellation notes).  The grace is only for plain disconnects: a caller
+  that closes after a safety stop (meta["stop"] = "safety") cancels the
+  flight at once, whoever else is attached.  The followers replay the
+  buffered tokens, unsafe ones included, so their own output check stops
+  them too.  A stopped flight is never reused.
+- A finished flight stays for LINGER_S so a duplicate that arrives just
+  after the reply ends replays it instead of generating again.  A flight
+  that failed or was cancelled is never reused.
+- Flights live on the engine loop (critters.aio) and are only touched from
+  there, so no lock is needed.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable, Dict, List, Optional
+
+from critters import telemetry
+
+GRACE_S  = float(os.getenv("LLM_SINGLEFLIGHT_GRACE_S", "1.5"))
+LINGER_S = float(os.getenv("LLM_SINGLEFLIGHT_LINGER_S", "30"))
+
+
+@dataclass
+class _Flight:
+    key:         str
+    tokens:      List[str] = field(default_factory=list)
+    meta:        Dict = field(default_factory=dict)
+    changed:     asyncio.Condition = field(default_factory=asyncio.Condition)
+    done:        bool = False
+    failed:      bool = False
+    error:       Optional[BaseException] = None
+    subscribers: int = 0
+    task:        Optional["asyncio.Task"] = None
+    reaper:      Optional[asyncio.TimerHandle] = None
+
+
+_flights: Dict[str, _Flight] = {}
+
+
+def flight_key(session_id, message_id, system_prompt: str, messages: List[Dict]) -> str:
+    """Key for one turn: session, the user message it answers, and the exact prompt."""
+    prompt = json.dumps([system_prompt, [(m.get("role"), m.get("content")) for m in messages]],
+                        ensure_ascii=False)
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    return f"{session_id}:{message_id}:{prompt_hash}"
+
+
+async def _notify(flight: _Flight) -> None:
+    async with flight.changed:
+        flight.changed.notify_all()
+
+
+async def _produce(flight: _Flight, stream: AsyncGenerator[str, None]) -> None:
+    try:
+        async with aclosing(stream):
+            async for token in stream:
+                flight.tokens.append(token)
+                await _notify(flight)
+    except asyncio.CancelledError:
+        flight.failed = True
+        raise
+    except Exception as e:
+        flight.failed = True
+        flight.error = e
+    finally:
+        flight.done = True
+        loop = asyncio.get_running_loop()
+        loop.call_later(0 if flight.failed else LINGER_S, _forget, flight)
+        loop.create_task(_notify(flight))
+
+
+def _forget(flight: _Flight) -> None:
+    if _flights.get(flight.key) is flight:
+        del _flights[flight.key]
+
+
+def _cancel(flight: _Flight) -> None:
+    if flight.reaper is not None:
+        flight.reaper.cancel()
+        flight.reaper = None
+    _forget(flight)
+    if not flight.done and flight.task is not None:
+        flight.task.cancel()
+
+
+def _abandon(flight: _Flight) -> None:
+    flight.reaper = None
+    if flight.subscribers == 0 and not flight.done and flight.task is not None:
+        _forget(flight)
+        flight.task.cancel()
+
+
+async def join(
+    key: str,
+    start: Callable[[Dict], AsyncGenerator[str, None]],
+    meta: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Stream the generation for ``key``, starting it with ``start(meta)`` only
+    if no usable flight exists.  ``meta`` receives the flight's meta (backend,
+    model) once the stream ends or is closed.  Set ``meta["stop"] = "safety"``
+    before closing to cancel the generation at once instead of after GRACE_S.
+    """
+    flight = _flights.get(key)
+    if flight is None or flight.failed:
+        flight = _flights[key] = _Flight(key)
+        flight.task = asyncio.ensure_future(_produce(flight, start(flight.meta)))
+    else:
+        telemetry.record("singleflight", key=key, replayed=len(flight.tokens), finished=flight.done)
+    if flight.reaper is not None:
+        flight.reaper.cancel()
+        flight.reaper = None
+
+    flight.subscribers += 1
+    sent = 0
+    try:
+        while True:
+            async with flight.changed:
+                await flight.changed.wait_for(lambda: len(flight.tokens) > sent or flight.done)
+            while sent < len(flight.tokens):
+                sent += 1
+                yield flight.tokens[sent - 1]
+            if flight.done and sent >= len(flight.tokens):
+                break
+        if flight.error is not None:
+            raise flight.error
+    finally:
+        # Also on an early close, so the caller learns which model was writing
+        if meta is not None:
+            meta.update(flight.meta)
+        flight.subscribers -= 1
+        if meta is not None and meta.get("stop") == "safety":
+            _cancel(flight)
+        elif flight.subscribers == 0 and not flight.done:
+            flight.reaper = asyncio.get_running_loop().call_later(GRACE_S, _abandon, flight)
@@ -0,0 +1,208 @@
+"""
+Smiling Critters — Stream Decoder
+Incremental NDJSON / SSE framing and field extraction for streamed replies.
+
+Known design constraints
+------------------------
+- Network chunks are appended to one bytearray and frames are found with
+  bytearray.find(); nothing is copied until a token is decoded, and then
+  straight from a memoryview into the str.  Consumed bytes are dropped
+  once per chunk, not once per frame.
+- Only complete frames are decoded, so a UTF-8 character or JSON string
+  split across chunks is never seen half-way.
+- NDJSON: one frame per line.  SSE: one frame per ``data:`` line (the only
+  field the backends we talk to use); comments, ``event:``/``id:`` lines and
+  blank separators are skipped.  ``\\r\\n`` line ends are accepted for both.
+- Frame.string() reads one string field without parsing the rest of the
+  frame.  Keys are matched as ``"key"`` followed by a colon, which can't
+  occur inside a JSON string (quotes in strings are escaped); the compact
+  and single-space forms are found with one bytes search each.  Values with
+  escapes go through json.loads for just that literal; a value that isn't a
+  string (e.g. null) reads as None.  Frame.json() parses everything and is
+  meant for the rare frames that need it (final stats, errors).
+- A Frame views the decoder's buffer and is only valid until the next
+  feed(); copy what you need to keep (bytes(frame)).  A slice of
+  frame.view held past that point makes the next feed() raise BufferError.
+"""
+
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_WS = b" \t\r\n"
+
+
+class Frame:
+    """One complete NDJSON line or SSE ``data:`` payload inside a buffer."""
+
+    __slots__ = ("buf", "view", "start", "end")
+
+    def __init__(self, buf: bytearray, view: memoryview, start: int, end: int):
+        self.buf, self.view, self.start, self.end = buf, view, start, end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __bytes__(self) -> bytes:
+        return self.view[self.start:self.end].tobytes()
+
+    def equals(self, literal: bytes) -> bool:
+        return self.end - self.start == len(literal) and self.buf.startswith(literal, self.start)
+
+    def contains(self, needle: bytes) -> bool:
+        return self.buf.find(needle, self.start, self.end) != -1
+
+    def string(self, key: bytes) -> Optional[str]:
+        """Value of the first ``key`` field if it is a string, else None."""
+        # Inlined fast path for the per-token call: "key":"value" without escapes
+        buf, start, end = self.buf, self.start, self.end
+        markers = _MARKERS.get(key) or _markers(key)
+        for marker in markers[1:]:
+            at = buf.find(marker, start, end)
+            if at != -1:
+                first = at + len(marker)
+                close = buf.find(b'"', first, end)
+                if close != -1 and buf.find(b"\\", first, close) == -1:
+                    return str(self.view[first:close], "utf-8")
+                return self._read_string(first)[0]
+        found = self._string_at(key, start, fast=False)
+        return found[0] if found else None
+
+    def strings(self, key: bytes) -> List[str]:
+        """Values of every string field ``key``, in order."""
+        out: List[str] = []
+        pos = self.start
+        while True:
+            found = self._string_at(key, pos)
+            if found is None:
+                return out
+            if found[0] is not None:
+                out.append(found[0])
+            pos = found[1]
+
+    def json(self):
+        return json.loads(self.view[self.start:self.end].tobytes())
+
+    def _string_at(self, key: bytes, pos: int, fast: bool = True) -> Optional[Tuple[Optional[str], int]]:
+        buf, end = self.buf, self.end
+        markers = _MARKERS.get(key) or _markers(key)
+        # Fast path: "key":"  or  "key": "  (compact and Python/Gemini spacing)
+        for marker in markers[1:] if fast else ():
+            at = buf.find(marker, pos, end)
+            if at != -1:
+                return self._read_string(at + len(marker))
+        # Any other spacing, or a value that isn't a string
+        while True:
+            at = buf.find(markers[0], pos, end)
+            if at == -1:
+                return None
+            i = at + len(markers[0])
+            while i < end and buf[i] in _WS:
+                i += 1
+            if i < end and buf[i] == 0x3A:      # ':' — otherwise the key text was a value
+                break
+            pos = at + 1
+        i += 1
+        while i < end and buf[i] in _WS:
+            i += 1
+        if i >= end or buf[i] != 0x22:
+            return None, i
+        return self._read_string(i + 1)
+
+    def _read_string(self, first: int) -> Tuple[Optional[str], int]:
+        buf, end = self.buf, self.end
+        close = buf.find(b'"', first, end)
+        if close == -1:
+            return None, end
+        if buf.find(b"\\", first, close) == -1:
+            return str(self.view[first:close], "utf-8"), close + 1
+        # Escapes present: find the real closing quote, then let json unescape
+        while True:
+            run, j = 0, close - 1
+            while buf[j] == 0x5C:               # count backslashes before the quote
+                run += 1
+                j -= 1
+            if run % 2 == 0:
+                break
+            close = buf.find(b'"', close + 1, end)
+            if close == -1:
+                return None, end
+        return json.loads(self.view[first - 1:close + 1].tobytes()), close + 1
+
+
+_MARKERS: Dict[bytes, Tuple[bytes, bytes, bytes]] = {}
+
+
+def _markers(key: bytes) -> Tuple[bytes, bytes, bytes]:
+    quoted = b'"' + key + b'"'
+    _MARKERS[key] = (quoted, quoted + b':"', quoted + b': "')
+    return _MARKERS[key]
+
+
+class FrameDecoder:
+    """Split a byte stream into Frames; ``framing`` is "ndjson" or "sse"."""
+
+    def __init__(self, framing: str = "ndjson"):
+        if framing not in ("ndjson", "sse"):
+            raise ValueError(f"unknown framing {framing!r}")
+        self.sse = framing == "sse"
+        self.buf = bytearray()
+        self._view: Optional[memoryview] = None
+        self._pos = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Frame]:
+        """Frames completed by ``chunk``.  Drain the iterator before feeding again."""
+        self._compact()
+        buf = self.buf
+        buf += chunk
+        view = self._view = memoryview(buf)
+        find, sse, pos = buf.find, self.sse, 0
+        while True:
+            nl = find(b"\n", pos)
+            if nl == -1:
+                break
+            start, end = pos, nl
+            pos = self._pos = nl + 1
+            if end > start and buf[end - 1] == 0x0D:       # \r\n
+                end -= 1
+            if end == start:                               # SSE event separator, blank line
+                continue
+            if sse:
+                if not buf.startswith(b"data:", start, end):
+                    continue
+                start += 6 if buf[start + 5:start + 6] == b" " else 5
+            if end > start:
+                yield Frame(buf, view, start, end)
+
+    def close(self) -> Iterator[Frame]:
+        """The last frame, if the stream ended without a newline."""
+        self._compact()
+        if self.buf:
+            view = self._view = memoryview(self.buf)
+            frame = self._frame(view, 0, len(self.buf))
+            self._pos = len(self.buf)
+            if frame is not None:
+                yield frame
+
+    def _compact(self) -> None:
+        # Frames from the previous chunk are no longer valid past this point
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._pos:
+            del self.buf[:self._pos]
+            self._pos = 0
+
+    def _frame(self, view: memoryview, start: int, end: int) -> Optional[Frame]:
+        buf = self.buf
+        if end > start and buf[end - 1] == 0x0D:       # \r\n
+            end -= 1
+        if self.sse:
+            if not buf.startswith(b"data:", start, end):
+                return None
+            start += 5
+            if start < end and buf[start] == 0x20:
+                start += 1
+        else:
+            while start < end and buf[start] in _WS:
+                start += 1
+        return Frame(buf, view, start, end) if end > start else None
@@ -0,0 +1,42 @@
+"""
+Smiling Critters — Router Telemetry
+In-process, lock-protected ring buffers of recent routing events (hedge
+outcomes, cancellations, ...) so deadlines and budgets can be tuned from data.
+
+Nothing here is persisted; events are lost on restart by design.  Each event
+kind keeps at most MAX_EVENTS entries.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+MAX_EVENTS = 500
+
+_lock = threading.Lock()
+_events: Dict[str, Deque[Dict]] = {}
+
+
+def record(kind: str, **fields) -> None:
+    """Append an event of ``kind``; ``at`` (epoch seconds) is added automatically."""
+    event = {"at": time.time(), **fields}
+    with _lock:
+        _events.setdefault(kind, deque(maxlen=MAX_EVENTS)).append(event)
+
+
+def recent(kind: str, limit: Optional[int] = None) -> List[Dict]:
+    """Most recent events of ``kind``, oldest first."""
+    with _lock:
+        events = list(_events.get(kind, ()))
+    return events[-limit:] if limit else events
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = math.ceil(pct / 100 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, k))]
@@ -0,0 +1,157 @@
+"""
+Smiling Critters — HTTP Transport
+Process-wide pool of keep-alive sessions for the LLM backends.
+
+Known design constraints
+------------------------
+- One requests.Session per backend origin (scheme + host + port) for the
+  short synchronous calls (reachability probes).  Sessions are shared by
+  every Streamlit script thread; urllib3's connection pool is thread-safe,
+  and the dict of sessions is guarded by _lock.
+- Timeouts are split into three phases: connect, first byte (model load +
+  prompt eval) and inter-token (gap between streamed chunks).
+- When the parent dashboard changes ``ollama_url`` the old origin's session
+  is closed via retire_stale(), so no pooled sockets linger to a dead box.
+- Streaming calls run on the engine loop (critters.aio) and use one
+  httpx.AsyncClient per origin with the same limits.  Those clients are
+  created, used and closed on the loop thread only.
+- Streamed bodies are read as raw chunks and split by one shared decoder
+  (critters.streamdecode) for both NDJSON and SSE framing.
+"""
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from critters import aio
+from critters.streamdecode import Frame, FrameDecoder
+
+# ── Pool tuning (env-overridable) ─────────────────────────────────────────────
+POOL_SIZE        = int(os.getenv("LLM_POOL_SIZE", "32"))           # sockets per origin
+KEEPALIVE_S      = float(os.getenv("LLM_KEEPALIVE_S", "120"))       # idle socket lifetime
+CONNECT_TIMEOUT  = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))     # TCP/TLS handshake
+FIRST_BYTE_TIMEOUT = float(os.getenv("LLM_FIRST_BYTE_TIMEOUT", "60"))  # model load + prompt eval
+INTER_TOKEN_TIMEOUT = float(os.getenv("LLM_INTER_TOKEN_TIMEOUT", "20"))  # stall between chunks
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    connect:     float = CONNECT_TIMEOUT
+    first_byte:  float = FIRST_BYTE_TIMEOUT
+    inter_token: float = INTER_TOKEN_TIMEOUT
+
+    def as_requests(self) -> Tuple[float, float]:
+        """(connect, read) tuple for requests — read covers the first byte."""
+        return (self.connect, self.first_byte)
+
+    def as_httpx(self) -> httpx.Timeout:
+        """httpx timeout — read covers headers; per-chunk gaps use aiter_frames_timed()."""
+        return httpx.Timeout(self.first_byte, connect=self.connect)
+
+
+DEFAULT_TIMEOUTS = Timeouts()
+PROBE_TIMEOUTS   = Timeouts(connect=2.0, first_byte=2.0, inter_token=2.0)
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_async_clients: Dict[str, httpx.AsyncClient] = {}  # touched on the engine loop only
+
+
+def origin(url: str) -> str:
+    """Normalise a URL to its pool key, e.g. 'http://localhost:11434'."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers.update({"Connection": "keep-alive", "Keep-Alive": f"timeout={int(KEEPALIVE_S)}"})
+    return s
+
+
+def get_session(url: str) -> requests.Session:
+    """Return the shared pooled session for the origin of ``url``."""
+    key = origin(url)
+    with _lock:
+        s = _sessions.get(key)
+        if s is None:
+            s = _sessions[key] = _build_session()
+        return s
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """Return the shared async client for the origin of ``url``.
+
+    Must be called from the engine loop.
+    """
+    key = origin(url)
+    client = _async_clients.get(key)
+    if client is None or client.is_closed:
+        client = _async_clients[key] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=POOL_SIZE,
+                max_keepalive_connections=POOL_SIZE,
+                keepalive_expiry=KEEPALIVE_S,
+            ),
+            timeout=DEFAULT_TIMEOUTS.as_httpx(),
+        )
+    return client
+
+
+async def _aretire(keep_keys: set) -> None:
+    stale = [k for k in _async_clients if k not in keep_keys]
+    for k in stale:
+        await _async_clients.pop(k).aclose()
+
+
+def retire_stale(keep: Iterable[str]) -> None:
+    """Close pooled sessions and async clients whose origin is not in ``keep``."""
+    keep_keys = {origin(u) for u in keep if u}
+    with _lock:
+        stale = [k for k in _sessions if k not in keep_keys]
+        closed = [_sessions.pop(k) for k in stale]
+    for s in closed:
+        s.close()
+    aio.submit(_aretire(keep_keys))
+
+
+def close_all() -> None:
+    retire_stale(())
+
+
+async def aiter_frames_timed(
+    resp: httpx.Response,
+    framing: str = "ndjson",
+    timeouts: Timeouts = DEFAULT_TIMEOUTS,
+) -> AsyncIterator[Frame]:
+    """Yield decoded frames (see critters.streamdecode), enforcing first-byte
+    then inter-token timeouts.
+
+    Raises asyncio.TimeoutError when the backend stalls.
+    """
+    decoder = FrameDecoder(framing)
+    chunks = resp.aiter_bytes()
+    limit = timeouts.first_byte
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), limit)
+            except StopAsyncIteration:
+                break
+            limit = timeouts.inter_token
+            for frame in decoder.feed(chunk):
+                yield frame
+        for frame in decoder.close():
+            yield frame
+    finally:
+        await chunks.aclose()
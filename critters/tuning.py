@@ -0,0 +1,323 @@
+"""
+Smiling Critters — Ollama Tuning
+Per-model num_thread / num_batch / num_ctx for the machine Ollama runs on.
+
+Known design constraints
+------------------------
+- calibrate() is slow — every trial reloads the model with new options — so
+  it only runs on demand: ``python utils/ollama_check.py --tune`` or the
+  parent dashboard's tune button.  Results are saved in the ``ollama_tuning``
+  setting (JSON keyed "url|model") and reach the router through its normal
+  config read, like every other setting.
+- The dashboard runs it through start_job(): one calibration per process,
+  driven from the engine loop (critters.aio) with the blocking trials on a
+  worker thread, so a render never waits on it.  A second start while one
+  is running is refused; job_status() reports progress for the page.
+- Host facts (cores, free memory) can only be read for an Ollama on this
+  machine.  For a remote box (or unknown memory) num_thread is left to
+  Ollama and the context ceiling is capped at DEFAULT_CTX_MAX.
+- Trials cover num_thread ∈ {physical cores, one fewer} × BATCH_CANDIDATES.
+  The winner has the lowest time for a representative turn: the calibration
+  prompt's evaluation plus REFERENCE_REPLY_TOKENS generated.
+- ctx_max is the largest CTX_BUCKETS entry whose KV cache fits in
+  KV_MEMORY_SHARE of the memory left after the model weights, capped by the
+  model's trained context length.
+- num_ctx is sized per request: the smallest bucket holding the prompt plus
+  num_predict, capped at ctx_max.  num_ctx is a load-time option — a new
+  value reloads the runner — so buckets are coarse and sticky: an endpoint
+  keeps the largest bucket it has used for a model until it has been idle
+  for CTX_STICKY_S (the model has then likely been unloaded anyway).
+- Untuned models still get per-request num_ctx sizing (with DEFAULT_CTX_MAX
+  as the ceiling); num_thread / num_batch are only sent once tuned.
+- configure() is called from the router's config read; options_for() runs on
+  the engine loop; state sits behind one lock.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from critters import aio, telemetry, transport
+
+CTX_BUCKETS            = (2048, 4096, 8192, 16384, 32768)
+DEFAULT_CTX_MAX        = int(os.getenv("LLM_DEFAULT_CTX_MAX", "4096"))
+KV_MEMORY_SHARE        = 0.5
+BATCH_CANDIDATES       = (256, 512)
+REFERENCE_REPLY_TOKENS = 120
+CALIBRATION_PREDICT    = 32
+CTX_STICKY_S           = float(os.getenv("LLM_CTX_STICKY_S", "1800"))
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+
+@dataclass
+class HostInfo:
+    cores:          int             # physical cores (logical if unknown)
+    mem_available:  Optional[int]   # bytes
+
+
+@dataclass
+class ModelFacts:
+    size_bytes:        Optional[int]
+    context_length:    Optional[int]
+    kv_bytes_per_token: Optional[int]
+
+
+_lock = threading.Lock()
+_raw: Optional[str] = None
+_tuned: Dict[str, Dict] = {}                        # "url|model" -> saved result
+_sticky: Dict[Tuple[str, str], Tuple[int, float]] = {}   # (url, model) -> (num_ctx, last used)
+
+
+# ── Host and model facts ─────────────────────────────────────────────────────
+
+def is_local(url: str) -> bool:
+    return (urlparse(url).hostname or "") in _LOCAL_HOSTS
+
+
+def probe_host() -> HostInfo:
+    """Physical cores and available memory of this machine."""
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    cores = logical
+    mem = None
+    try:
+        with open("/proc/cpuinfo") as f:
+            pairs, phys = set(), None
+            for line in f:
+                if line.startswith("physical id"):
+                    phys = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    pairs.add((phys, line.split(":")[1].strip()))
+        if pairs:
+            cores = min(logical, len(pairs))
+    except OSError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    mem = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        try:
+            mem = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError, AttributeError):
+            pass
+    return HostInfo(cores=max(1, cores), mem_available=mem)
+
+
+def model_facts(url: str, model: str) -> ModelFacts:
+    """Weights size, trained context length and KV bytes per token, from Ollama."""
+    session = transport.get_session(url)
+    size = None
+    try:
+        tags = session.get(f"{url}/api/tags", timeout=5).json().get("models", [])
+        size = next((m.get("size") for m in tags if m.get("name") == model), None)
+    except Exception:
+        pass
+    try:
+        info = session.post(f"{url}/api/show", json={"model": model, "name": model},
+                            timeout=10).json().get("model_info", {})
+    except Exception:
+        info = {}
+    arch = info.get("general.architecture", "")
+
+    def _get(key: str) -> Optional[int]:
+        value = info.get(f"{arch}.{key}")
+        return int(value) if isinstance(value, (int, float)) else None
+
+    layers, kv_heads = _get("block_count"), _get("attention.head_count_kv")
+    heads, embed     = _get("attention.head_count"), _get("embedding_length")
+    kv = None
+    if layers and kv_heads and heads and embed:
+        kv = 2 * layers * kv_heads * (embed // heads) * 2    # K and V, fp16
+    return ModelFacts(size_bytes=size, context_length=_get("context_length"), kv_bytes_per_token=kv)
+
+
+def ctx_ceiling(host: Optional[HostInfo], facts: ModelFacts) -> int:
+    """Largest num_ctx bucket this model can afford on this host."""
+    limit = facts.context_length or CTX_BUCKETS[-1]
+    if host and host.mem_available and facts.kv_bytes_per_token:
+        spare = max(0, host.mem_available - (facts.size_bytes or 0)) * KV_MEMORY_SHARE
+        limit = min(limit, int(spare // facts.kv_bytes_per_token))
+    else:
+        limit = min(limit, DEFAULT_CTX_MAX)
+    fitting = [b for b in CTX_BUCKETS if b <= limit]
+    return fitting[-1] if fitting else CTX_BUCKETS[0]
+
+
+# ── Calibration ──────────────────────────────────────────────────────────────
+
+def _trial(url: str, model: str, options: Dict) -> Dict:
+    from critters.personas import SHARED_PREFIX
+    resp = transport.get_session(url).post(
+        f"{url}/api/generate",
+        json={
+            "model": model,
+            "stream": False,
+            # A fresh nonce up front so no trial is served from the KV cache
+            "prompt": f"[{uuid.uuid4().hex}]\n{SHARED_PREFIX}\nSay hello to a child in two sentences.",
+            "options": {**options, "num_ctx": CTX_BUCKETS[0], "num_predict": CALIBRATION_PREDICT,
+                        "temperature": 0},
+        },
+        timeout=600,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    prompt_s = (data.get("prompt_eval_duration") or 0) / 1e9
+    eval_s   = (data.get("eval_duration") or 0) / 1e9
+    tokens   = data.get("eval_count") or 0
+    per_token = eval_s / tokens if tokens and eval_s else float("inf")   # no timings: never the winner
+    return {
+        **options,
+        "prompt_tps": round((data.get("prompt_eval_count") or 0) / prompt_s, 1) if prompt_s else None,
+        "eval_tps":   round(1 / per_token, 1) if tokens and eval_s else None,
+        "turn_s":     round(prompt_s + REFERENCE_REPLY_TOKENS * per_token, 2),
+    }
+
+
+def calibrate(url: str, model: str, on_trial: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Try the candidate options on ``url`` and return the best, ready for save()."""
+    host  = probe_host() if is_local(url) else None
+    facts = model_facts(url, model)
+    threads: List[Optional[int]] = [None]
+    if host:
+        threads = sorted({host.cores, max(1, host.cores - 1)}, reverse=True)
+    trials = []
+    for num_thread in threads:
+        for num_batch in BATCH_CANDIDATES:
+            options = {"num_batch": num_batch}
+            if num_thread is not None:
+                options["num_thread"] = num_thread
+            result = _trial(url, model, options)
+            trials.append(result)
+            if on_trial:
+                on_trial(result)
+    best = min(trials, key=lambda t: t["turn_s"])
+    result = {
+        "num_thread": best.get("num_thread"),
+        "num_batch":  best["num_batch"],
+        "ctx_max":    ctx_ceiling(host, facts),
+        "prompt_tps": best["prompt_tps"],
+        "eval_tps":   best["eval_tps"],
+        "host_cores": host.cores if host else None,
+        "tuned_at":   time.time(),
+        "trials":     trials,
+    }
+    telemetry.record("tuning", url=url, model=model, **{k: v for k, v in result.items() if k != "trials"})
+    return result
+
+
+def save(url: str, model: str, tuned: Dict) -> None:
+    """Store a calibration result in the ``ollama_tuning`` setting."""
+    from db.queries import get_setting, set_setting
+    try:
+        saved = json.loads(get_setting("ollama_tuning") or "{}")
+    except ValueError:
+        saved = {}
+    saved[f"{url}|{model}"] = tuned
+    set_setting("ollama_tuning", json.dumps(saved))
+
+
+# ── Background calibration ───────────────────────────────────────────────────
+
+_job_lock = threading.Lock()
+_job: Dict = {}
+
+
+def start_job(urls: List[str], models: List[str]) -> bool:
+    """Calibrate and save every (url, model) in the background; False if a run is already going."""
+    pairs = [(url, model) for url in urls for model in models]
+    with _job_lock:
+        if _job.get("running") or not pairs:
+            return False
+        _job.clear()
+        _job.update(running=True, total=len(pairs), done=0, current=None, trials=0,
+                    results=[], errors=[], started_at=time.time())
+    aio.submit(_run_job(pairs))
+    return True
+
+
+def job_status() -> Dict:
+    """Progress of the current or last start_job() run ({} if none has run)."""
+    with _job_lock:
+        return {**_job, "results": list(_job.get("results", [])), "errors": list(_job.get("errors", []))}
+
+
+def _count_trial(_result: Dict) -> None:
+    with _job_lock:
+        _job["trials"] += 1
+
+
+async def _run_job(pairs: List[Tuple[str, str]]) -> None:
+    try:
+        for url, model in pairs:
+            with _job_lock:
+                _job.update(current=(url, model), trials=0)
+            try:
+                result = await asyncio.to_thread(calibrate, url, model, _count_trial)
+                await asyncio.to_thread(save, url, model, result)
+                with _job_lock:
+                    _job["results"].append({"url": url, "model": model, **result})
+            except Exception as e:
+                with _job_lock:
+                    _job["errors"].append({"url": url, "model": model, "error": str(e)})
+            finally:
+                with _job_lock:
+                    _job["done"] += 1
+    finally:
+        with _job_lock:
+            _job.update(running=False, current=None)
+
+
+# ── Per-request options ──────────────────────────────────────────────────────
+
+def configure(raw: Optional[str]) -> None:
+    """Install the saved ``ollama_tuning`` JSON (parsed only when it changed)."""
+    global _raw, _tuned
+    with _lock:
+        if raw == _raw:
+            return
+        _raw = raw
+        try:
+            _tuned = json.loads(raw) if raw else {}
+        except ValueError:
+            _tuned = {}
+
+
+def tuned(url: str, model: str) -> Optional[Dict]:
+    """The saved calibration for ``model`` on ``url``, if any."""
+    with _lock:
+        return _tuned.get(f"{url}|{model}")
+
+
+def estimate_tokens(system_prompt: str, messages: List[Dict]) -> int:
+    """Rough prompt size (~4 characters per token plus per-message overhead)."""
+    return (len(system_prompt) + sum(len(m.get("content", "")) for m in messages)) // 4 + 4 * (len(messages) + 1)
+
+
+def options_for(url: str, model: str, prompt_tokens: int, num_predict: int) -> Dict:
+    """Ollama options for one request: tuned threads/batch plus a sized num_ctx."""
+    now = time.monotonic()
+    with _lock:
+        saved = _tuned.get(f"{url}|{model}") or {}
+        ceiling = saved.get("ctx_max") or DEFAULT_CTX_MAX
+        need = prompt_tokens + num_predict
+        bucket = next((b for b in CTX_BUCKETS if b >= need), CTX_BUCKETS[-1])
+        prev, used = _sticky.get((url, model), (0, 0.0))
+        if now - used > CTX_STICKY_S:
+            prev = 0
+        num_ctx = min(max(bucket, prev), max(ceiling, CTX_BUCKETS[0]))
+        _sticky[(url, model)] = (num_ctx, now)
+    options = {"num_ctx": num_ctx}
+    if saved.get("num_thread"):
+        options["num_thread"] = saved["num_thread"]
+    if saved.get("num_batch"):
+        options["num_batch"] = saved["num_batch"]
+    return options
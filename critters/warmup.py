@@ -0,0 +1,159 @@
+"""
+Smiling Critters — Model Warm-up
+Loads the Ollama model and pre-evaluates a persona prompt in the background,
+so the child's first message doesn't pay a cold model load.
+
+Known design constraints
+------------------------
+- schedule() never blocks the caller: it only posts a request to the engine
+  loop (critters.aio).  Safe to call on every Streamlit rerun.
+- The model warmed is the one the critter's generation profile will use
+  (critters.personas), so a "fast" critter warms the small model.
+- One warm-up worker per Ollama URL; with several endpoints configured every
+  healthy one is warmed, since any of them may take the child's session.
+  Requests are coalesced into a single "latest wanted" slot, so flicking
+  through the home carousel warms the critter the child stopped on rather
+  than queueing all eight.
+- A (url, model, critter) that was warmed less than WARM_FRESH_S ago is
+  skipped; that window sits inside OLLAMA_KEEP_ALIVE, so the model is still
+  resident.
+- Only a failed connection reports the endpoint down to the health prober.
+  A 404 for a model that hasn't been pulled, or a load slower than
+  OLLAMA_LOAD_TIMEOUT_S, is recorded as a failed "warmup" event and that
+  (url, model, critter) isn't retried for WARM_FRESH_S; the endpoint stays
+  in the pool.
+- Warm-up is Ollama-only (other critters.providers endpoints are left
+  alone) and is skipped while the health prober reports the
+  backend down.  It uses the same /api/generate shape as a session's first
+  turn (critters.kv_context), so the evaluated system prompt is a reusable
+  KV-cache prefix.  It loads with the same critters.tuning options a chat
+  turn sends, since a different num_ctx or num_thread would reload the model.
+- is_warm() is our own belief that a model is resident: a warm-up or a
+  finished chat turn on that (url, model) within WARM_FRESH_S.  That
+  window is shorter than OLLAMA_KEEP_ALIVE and starts empty after a
+  restart, so is_cold() only calls a model cold when, on top of that,
+  Ollama's /api/ps (via critters.health) confirms it isn't loaded.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from critters import aio, health, kv_context, ladder, providers, telemetry, transport, tuning
+
+WARM_FRESH_S = 240.0
+_MODEL_ONLY = "__model__"
+# A cold load reads the whole model from disk: allow far longer than a turn's first byte
+OLLAMA_LOAD_TIMEOUT_S = float(os.getenv("OLLAMA_LOAD_TIMEOUT_S", "300"))
+_LOAD_TIMEOUTS = transport.Timeouts(first_byte=OLLAMA_LOAD_TIMEOUT_S)
+
+_warmed_at: Dict[tuple, float] = {}       # (url, model, critter) -> monotonic
+_failed_at: Dict[tuple, float] = {}       # (url, model, critter) -> monotonic
+_wanted: Dict[str, Optional[str]] = {}    # url -> latest requested critter id
+_workers: Dict[str, asyncio.Task] = {}    # url -> running worker
+
+
+def schedule(critter_id: Optional[str] = None) -> None:
+    """Request a background warm-up of the model (and persona, if given)."""
+    try:
+        aio.submit(_request(critter_id))
+    except Exception:
+        pass  # warm-up is an optimisation; never let it break a render
+
+
+def is_warm(url: str, model: str) -> bool:
+    """Has ``model`` on ``url`` been loaded recently enough to still be resident?"""
+    return time.monotonic() - _warmed_at.get((url, model, _MODEL_ONLY), float("-inf")) < WARM_FRESH_S
+
+
+def is_cold(url: str, model: str) -> bool:
+    """Is ``model`` confirmed not loaded on ``url``?  Unknown counts as loaded."""
+    if is_warm(url, model):
+        return False
+    loaded = health.prober.loaded_models(url)
+    return loaded is not None and health.model_tag(model) not in loaded
+
+
+def mark_warm(url: str, model: str) -> None:
+    """Record that ``model`` just served a turn on ``url``."""
+    _warmed_at[(url, model, _MODEL_ONLY)] = time.monotonic()
+
+
+async def _request(critter_id: Optional[str]) -> None:
+    from critters.router import _get_config
+    cfg = await asyncio.to_thread(_get_config)
+    for url in cfg["ollama_urls"]:
+        if health.prober.is_available(url) is False or not providers.for_url(url).ollama_native:
+            continue
+        _wanted[url] = critter_id or _MODEL_ONLY
+        worker = _workers.get(url)
+        if worker is None or worker.done():
+            _workers[url] = asyncio.get_running_loop().create_task(_worker(url))
+
+
+async def _worker(url: str) -> None:
+    from critters.personas import get_profile
+    while url in _wanted:
+        critter_id = _wanted.pop(url)
+        tier  = get_profile(None if critter_id == _MODEL_ONLY else critter_id)["model"]
+        model = ladder.select(url, tier)   # the model this critter's turns will use
+        key = (url, model, critter_id)
+        now = time.monotonic()
+        if (now - _warmed_at.get(key, float("-inf")) < WARM_FRESH_S
+                or now - _failed_at.get(key, float("-inf")) < WARM_FRESH_S):
+            continue
+        try:
+            await _warm(url, model, None if critter_id == _MODEL_ONLY else critter_id)
+            _warmed_at[key] = time.monotonic()
+            _warmed_at[(url, model, _MODEL_ONLY)] = time.monotonic()
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            health.prober.report(url, False)
+            return
+        except Exception as e:
+            # Reachable but the load failed (model not pulled, too slow): not a down endpoint
+            _failed_at[key] = time.monotonic()
+            telemetry.record("warmup", critter_id=None if critter_id == _MODEL_ONLY else critter_id,
+                             model=model, url=url, took_s=time.monotonic() - now,
+                             error=_describe(e))
+
+
+async def _warm(url: str, model: str, critter_id: Optional[str]) -> None:
+    started = time.monotonic()
+    payload: Dict = {
+        "model": model,
+        "stream": False,
+        "keep_alive": kv_context.OLLAMA_KEEP_ALIVE,
+    }
+    if critter_id is None:
+        payload["prompt"] = ""   # empty prompt = load the model only
+        payload["options"] = tuning.options_for(url, model, 0, 1)
+    else:
+        from critters.personas import get_critter
+        system_prompt = get_critter(critter_id)["system_prompt"]
+        payload.update({
+            "system": system_prompt,
+            "prompt": "hi",
+            "options": {"temperature": 0.7, "num_predict": 1,
+                        **tuning.options_for(url, model, tuning.estimate_tokens(system_prompt, []), 1)},
+        })
+    client = transport.get_async_client(url)
+    resp = await client.post(f"{url}/api/generate", json=payload, timeout=_LOAD_TIMEOUTS.as_httpx())
+    resp.raise_for_status()
+    data = resp.json()
+    telemetry.record(
+        "warmup",
+        critter_id=critter_id,
+        model=model,
+        took_s=time.monotonic() - started,
+        load_s=(data.get("load_duration") or 0) / 1e9,
+        prompt_eval_count=data.get("prompt_eval_count"),
+    )
+
+
+def _describe(e: BaseException) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"HTTP {e.response.status_code}"
+    return type(e).__name__
@@ -7,7 +7,8 @@ Stores: chat messages, session metadata, safety flags, parent alerts.
 import sqlite3
 import os
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -42,7 +43,9 @@ def init_db():
             content     TEXT    NOT NULL,
             critter_id  TEXT,
             timestamp   TEXT    NOT NULL,
-            flagged     INTEGER DEFAULT 0  -- 0=safe, 1=redirect, 2=alert, 3=crisis
+            flagged     INTEGER DEFAULT 0, -- 0=safe, 1=redirect, 2=alert, 3=crisis
+            model       TEXT,              -- model that wrote an assistant reply; NULL if pre-written
+            reply_to    INTEGER            -- user message an assistant reply answers
         );
 
         CREATE TABLE IF NOT EXISTS safety_flags (
@@ -76,7 +79,34 @@ def init_db():
             duration_min    INTEGER DEFAULT 0,
             created_at      TEXT    NOT NULL
         );
+
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key       TEXT PRIMARY KEY,
+            critter_id      TEXT,
+            response        TEXT    NOT NULL,
+            created_at      TEXT    NOT NULL,
+            last_used_at    TEXT    NOT NULL,
+            hits            INTEGER DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_response_cache_lru ON response_cache(last_used_at);
+
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            name            TEXT PRIMARY KEY,   -- e.g. 'gemini'
+            tokens          REAL    NOT NULL,   -- token bucket level
+            refilled_at     REAL    NOT NULL,   -- epoch seconds of last refill
+            backoff_until   REAL    NOT NULL DEFAULT 0  -- epoch seconds; 429 cooldown
+        );
     """)
+    # Columns added after first release — CREATE TABLE IF NOT EXISTS won't add them
+    message_cols = {row["name"] for row in conn.execute("PRAGMA table_info(messages)")}
+    if "model" not in message_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN model TEXT")
+    if "reply_to" not in message_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN reply_to INTEGER")
+    # One stored reply per user message, however many times a turn is replayed
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_reply_to ON messages(reply_to) WHERE reply_to IS NOT NULL"
+    )
     conn.commit()
 
     # User-configurable defaults — only set if not already in DB (preserve user changes)
@@ -171,18 +201,48 @@ def save_message(
     role: str,
     content: str,
     critter_id: str,
-    flagged: int = 0
+    flagged: int = 0,
+    model: Optional[str] = None,
+    reply_to: Optional[int] = None,
+    dedupe_s: float = 0.0,
 ) -> int:
+    """Store a message and return its id.
+
+    Safe to call twice for the same turn (Streamlit reruns, double taps):
+    an assistant row with ``reply_to`` is written once per user message, and
+    with ``dedupe_s`` a user message identical to the session's last one,
+    sent within that many seconds and still unanswered, returns the
+    existing id instead of a new row.
+    """
+    now  = datetime.now()
     conn = _get_conn()
-    cur = conn.execute(
-        """INSERT INTO messages (session_id, role, content, critter_id, timestamp, flagged)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (session_id, role, content, critter_id, datetime.now().isoformat(), flagged)
-    )
-    msg_id = cur.lastrowid or 0
-    conn.commit()
-    conn.close()
-    return msg_id
+    try:
+        conn.execute("BEGIN IMMEDIATE")   # check-then-insert must not interleave
+        if reply_to is not None:
+            row = conn.execute("SELECT id FROM messages WHERE reply_to=?", (reply_to,)).fetchone()
+            if row:
+                conn.rollback()
+                return row["id"]
+        elif dedupe_s > 0:
+            row = conn.execute(
+                "SELECT id, content, timestamp FROM messages WHERE session_id=? AND role=? ORDER BY id DESC LIMIT 1",
+                (session_id, role)
+            ).fetchone()
+            if row and row["content"] == content \
+                    and now - datetime.fromisoformat(row["timestamp"]) <= timedelta(seconds=dedupe_s) \
+                    and not conn.execute("SELECT 1 FROM messages WHERE reply_to=?", (row["id"],)).fetchone():
+                conn.rollback()
+                return row["id"]
+        cur = conn.execute(
+            """INSERT INTO messages (session_id, role, content, critter_id, timestamp, flagged, model, reply_to)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (session_id, role, content, critter_id, now.isoformat(), flagged, model, reply_to)
+        )
+        msg_id = cur.lastrowid or 0
+        conn.commit()
+        return msg_id
+    finally:
+        conn.close()
 
 
 def get_session_messages(session_id: int) -> List[Dict]:
@@ -344,3 +404,105 @@ def get_journal_entries(limit: int = 50) -> List[Dict]:
     ).fetchall()
     conn.close()
     return [dict(r) for r in rows]
+
+
+# ─── Response cache ──────────────────────────────────────────────────────────
+
+def get_cached_response(cache_key: str, max_age_s: float) -> Optional[str]:
+    """Return a cached reply younger than max_age_s and bump its LRU stamp."""
+    now    = datetime.now()
+    cutoff = (now - timedelta(seconds=max_age_s)).isoformat()
+    conn = _get_conn()
+    row = conn.execute(
+        "SELECT response FROM response_cache WHERE cache_key=? AND created_at>=?",
+        (cache_key, cutoff),
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE response_cache SET last_used_at=?, hits=hits+1 WHERE cache_key=?",
+            (now.isoformat(), cache_key),
+        )
+        conn.commit()
+    conn.close()
+    return row["response"] if row else None
+
+
+def put_cached_response(cache_key: str, critter_id: str, response: str, max_entries: int, max_age_s: float):
+    """Store a reply, then evict expired rows and least-recently-used overflow."""
+    now    = datetime.now()
+    cutoff = (now - timedelta(seconds=max_age_s)).isoformat()
+    conn = _get_conn()
+    conn.execute(
+        """INSERT OR REPLACE INTO response_cache
+           (cache_key, critter_id, response, created_at, last_used_at, hits)
+           VALUES (?, ?, ?, ?, ?, 0)""",
+        (cache_key, critter_id, response, now.isoformat(), now.isoformat()),
+    )
+    conn.execute("DELETE FROM response_cache WHERE created_at<?", (cutoff,))
+    conn.execute(
+        """DELETE FROM response_cache WHERE cache_key IN (
+               SELECT cache_key FROM response_cache
+               ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)""",
+        (max_entries,),
+    )
+    conn.commit()
+    conn.close()
+
+
+# ─── Shared rate limits ──────────────────────────────────────────────────────
+# Epoch-second REALs rather than ISO strings: every Streamlit process on the
+# host compares them against time.time() many times a minute.
+
+def take_rate_token(name: str, rate_per_s: float, burst: float) -> float:
+    """Atomically take one token from ``name``'s bucket.
+
+    Returns 0.0 when a token was taken, otherwise the seconds to wait — until
+    the backoff deadline or until the bucket refills one token.
+    """
+    now  = time.time()
+    conn = _get_conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")   # serialise read-modify-write across processes
+        row = conn.execute(
+            "SELECT tokens, refilled_at, backoff_until FROM rate_limits WHERE name=?", (name,)
+        ).fetchone()
+        tokens, refilled_at, backoff_until = (row["tokens"], row["refilled_at"], row["backoff_until"]) \
+            if row else (burst, now, 0.0)
+        if backoff_until > now:
+            conn.rollback()
+            return backoff_until - now
+        tokens = min(burst, tokens + max(0.0, now - refilled_at) * rate_per_s)
+        wait = 0.0
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / rate_per_s
+        conn.execute(
+            """INSERT INTO rate_limits (name, tokens, refilled_at, backoff_until) VALUES (?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET tokens=excluded.tokens, refilled_at=excluded.refilled_at""",
+            (name, tokens, now, backoff_until),
+        )
+        conn.commit()
+        return wait
+    finally:
+        conn.close()
+
+
+def set_rate_backoff(name: str, until: float, burst: float):
+    """Push ``name``'s backoff deadline to at least ``until`` (epoch seconds)."""
+    conn = _get_conn()
+    conn.execute(
+        """INSERT INTO rate_limits (name, tokens, refilled_at, backoff_until) VALUES (?, ?, ?, ?)
+           ON CONFLICT(name) DO UPDATE SET backoff_until=MAX(backoff_until, excluded.backoff_until)""",
+        (name, burst, time.time(), until),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_rate_backoff(name: str) -> float:
+    """Backoff deadline for ``name`` in epoch seconds (0.0 if none)."""
+    conn = _get_conn()
+    row = conn.execute("SELECT backoff_until FROM rate_limits WHERE name=?", (name,)).fetchone()
+    conn.close()
+    return row["backoff_until"] if row else 0.0
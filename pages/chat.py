@@ -3,19 +3,48 @@ Smiling Critters — Chat Interface (v2)
 Improved visuals, emotion wheel for Luna, Ollama debug panel, better flow.
 """
 
+import os
 import streamlit as st
 import time
 from datetime import datetime
 
 from critters.personas import get_critter
 from critters.router import get_llm_response, check_llm_status
-from safety.filters import check_input, check_output, FlagLevel, wellness_reminder
+from safety.filters import check_input, FlagLevel, OutputScanner, wellness_reminder
 from db.queries import (
     start_session, end_session, save_message, save_flag,
     get_setting, get_session_messages, save_journal_entry
 )
 from theme import get_critter_avatar, get_critter_pil_avatar, get_critter_icon_img
 
+# Same text again within this window, still unanswered, is the same turn (rerun / double tap)
+DUPLICATE_TURN_S = 10
+
+# Streaming repaint cadence: every repaint resends the whole reply over the websocket
+RENDER_INTERVAL_S = int(os.getenv("CHAT_RENDER_INTERVAL_MS", "80")) / 1000
+_SENTENCE_ENDS    = (".", "!", "?", "…", "\n")
+
+
+class _RenderCoalescer:
+    """
+    Repaints a streaming reply at most every ``interval_s``, or as soon as a
+    sentence ends, instead of once per token.  The first token paints at
+    once.  The caller's final (cursor-free) render is the completion flush.
+    """
+
+    def __init__(self, render, interval_s: float = RENDER_INTERVAL_S):
+        self.render     = render
+        self.interval_s = interval_s
+        self.renders    = 0
+        self._last      = float("-inf")
+
+    def push(self, text: str) -> None:
+        now = time.monotonic()
+        if now - self._last >= self.interval_s or text.rstrip(" *_").endswith(_SENTENCE_ENDS):
+            self._last = now
+            self.renders += 1
+            self.render(text)
+
 
 def _init_session(critter_id: str):
     if not st.session_state.get("session_id"):
@@ -93,10 +122,12 @@ def render_chat():
         status = check_llm_status()
         active = status.get("active", "none")
         backoff_secs = status.get("gemini", {}).get("backoff_secs", 0)
+        cooling_secs = status.get("cooling_secs", 0)
         status_html = {
             "ollama":       '<span style="background:#E8F5E9;color:#2E7D32;border-radius:12px;padding:0.2rem 0.6rem;font-size:0.75rem;font-weight:700;">🏠 Local</span>',
             "gemini":       '<span style="background:#E3F2FD;color:#1565C0;border-radius:12px;padding:0.2rem 0.6rem;font-size:0.75rem;font-weight:700;">☁️ Cloud</span>',
             "rate_limited": f'<span style="background:#FFF3E0;color:#E65100;border-radius:12px;padding:0.2rem 0.6rem;font-size:0.75rem;font-weight:700;" title="Gemini rate-limited, retrying in {backoff_secs}s">⏳ Cooling</span>',
+            "cooling":      f'<span style="background:#FFF3E0;color:#E65100;border-radius:12px;padding:0.2rem 0.6rem;font-size:0.75rem;font-weight:700;" title="AI resting after repeated errors, retrying in {cooling_secs}s">⏳ Cooling</span>',
             "none":         '<span style="background:#FFEBEE;color:#C62828;border-radius:12px;padding:0.2rem 0.6rem;font-size:0.75rem;font-weight:700;">❌ Off</span>',
         }.get(active, "")
         st.markdown(f'<div style="padding-top:0.8rem;text-align:right;">{status_html}</div>', unsafe_allow_html=True)
@@ -308,46 +339,81 @@ def _handle_message(user_text: str, critter: dict, prefer_local: bool):
     flag_int   = {"safe": 0, "redirect": 1, "alert": 2, "crisis": 3}.get(safety.level.value, 0)
 
     session_id = st.session_state.session_id
-    msg_id = save_message(session_id, "user", user_text, critter_id, flagged=flag_int)
-    st.session_state.chat_messages.append({"role": "user", "content": user_text})
-
-    if safety.level != FlagLevel.SAFE and safety.parent_note:
+    history    = st.session_state.chat_messages
+    msg_id = save_message(session_id, "user", user_text, critter_id, flagged=flag_int,
+                          dedupe_s=DUPLICATE_TURN_S)
+    # A rerun or double tap replays the same turn: same row, same history entry
+    duplicate = any(m.get("id") == msg_id for m in history)
+    if not duplicate:
+        history.append({"role": "user", "content": user_text, "id": msg_id})
+
+    if safety.level != FlagLevel.SAFE and safety.parent_note and not duplicate:
         save_flag(session_id, msg_id, safety.level.value, safety.reason or "", safety.parent_note or "")
 
     # Redirect / crisis — pre-written response, don't call LLM
     if safety.redirect_message:
         response = safety.redirect_message
-        save_message(session_id, "assistant", response, critter_id)
-        st.session_state.chat_messages.append({"role": "assistant", "content": response})
+        save_message(session_id, "assistant", response, critter_id, reply_to=msg_id)
+        _remember_reply(msg_id, response)
         st.rerun()
         return
 
-    # Call LLM with streaming
+    # Call LLM with streaming — the prompt ends at this turn, even when replayed
+    upto = next(i for i, m in enumerate(history) if m.get("id") == msg_id)
     llm_messages = [
         {"role": m["role"], "content": m["content"]}
-        for m in st.session_state.chat_messages
+        for m in history[:upto + 1]
     ]
 
     with st.chat_message("assistant", avatar=_pil_avatar):
         placeholder   = st.empty()
         full_response = ""
+        served_by: dict = {}
+
+        def _show_queue(queued):
+            # Waiting for a free AI slot — a friendly "thinking" state instead of silence
+            ahead = (f"{queued.position} friend{'s' if queued.position != 1 else ''} ahead of you"
+                     if queued.position else "you're next")
+            placeholder.markdown(
+                f'<div style="color:#aaa;font-family:Nunito Sans,sans-serif;">'
+                f'💭 {critter["name"]} is thinking… ({ahead}, about {max(1, round(queued.eta_s))}s)</div>',
+                unsafe_allow_html=True
+            )
 
+        stream = get_llm_response(
+            system_prompt=critter["system_prompt"],
+            messages=llm_messages,
+            use_local=prefer_local,
+            critter_id=critter_id,
+            session_id=session_id,
+            on_wait=_show_queue,
+            meta=served_by,
+            message_id=msg_id,
+        )
+        painter = _RenderCoalescer(lambda text: placeholder.markdown(
+            f'<div style="color:{critter["color"]};font-family:Nunito Sans,sans-serif;">{text}▌</div>',
+            unsafe_allow_html=True
+        ))
+        # Layer 3: output safety check, token by token — only cleared text is shown
+        scanner = OutputScanner()
         try:
-            for token in get_llm_response(
-                system_prompt=critter["system_prompt"],
-                messages=llm_messages,
-                use_local=prefer_local,
-            ):
-                full_response += token
-                placeholder.markdown(
-                    f'<div style="color:{critter["color"]};font-family:Nunito Sans,sans-serif;">{full_response}▌</div>',
-                    unsafe_allow_html=True
-                )
+            for token in stream:
+                if scanner.feed(token):
+                    served_by["stop"] = "safety"   # cancel a shared generation now, not after its grace
+                    break           # unsafe: stop generating, swap in the redirect below
+                painter.push(scanner.cleared)
+            full_response = scanner.text
         except Exception as e:
             full_response = f"Oops, my brain went fuzzy for a second! 🌟 Can you try again? (Error: {str(e)[:60]})"
-
-        # Layer 3: output safety check
-        out_safety = check_output(full_response)
+            scanner = OutputScanner()
+            scanner.feed(full_response)
+        finally:
+            # A rerun (child tapped Home/Bye, the tab went away) or an unsafe
+            # reply leaves the loop early — close now so the model stops
+            # generating for nobody.
+            stream.close()
+
+        out_safety = scanner.finish()
         if out_safety.redirect_message:
             full_response = out_safety.redirect_message
             if out_safety.parent_note:
@@ -359,8 +425,18 @@ def _handle_message(user_text: str, critter: dict, prefer_local: bool):
             unsafe_allow_html=True
         )
 
-    save_message(session_id, "assistant", full_response, critter_id)
-    st.session_state.chat_messages.append({"role": "assistant", "content": full_response})
+    # served_by["model"] is set once a backend starts answering, so a reply the
+    # output filter stopped is still attributed to the model that wrote it
+    save_message(session_id, "assistant", full_response, critter_id, model=served_by.get("model"),
+                 reply_to=msg_id)
+    _remember_reply(msg_id, full_response)
+
+
+def _remember_reply(msg_id: int, response: str):
+    """Add the reply to the on-screen history once, even if the turn ran twice."""
+    history = st.session_state.chat_messages
+    if not any(m.get("reply_to") == msg_id for m in history):
+        history.append({"role": "assistant", "content": response, "reply_to": msg_id})
 
 
 def _do_end_session():
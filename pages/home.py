@@ -7,11 +7,13 @@ Prev / Next arrows navigate; a big "Chat!" button starts the session.
 import streamlit as st
 import streamlit.components.v1 as components
 from critters.personas import get_all_critters
+from critters.warmup import schedule as schedule_warmup
 from db.queries import get_setting
 from theme import get_critter_avatar, get_critter_icon_img, get_critter_pil_avatar
 
 
 def _go_to_chat(critter_id: str):
+    schedule_warmup(critter_id)
     st.session_state.update({
         "current_critter": critter_id,
         "page":            "chat",
@@ -34,6 +36,9 @@ def render_home():
     idx     = st.session_state.home_idx
     critter = critters[idx]
 
+    # Pre-load the model + this critter's prompt while the child looks at the card
+    schedule_warmup(critter["id"])
+
     # ── Greeting ───────────────────────────────────────────────────────────────
     st.markdown(f"""
     <div style="text-align:center; padding: 1.2rem 0 0.6rem 0;">
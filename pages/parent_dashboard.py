@@ -11,7 +11,8 @@ from db.queries import (
     acknowledge_flag, get_usage_stats
 )
 from critters.personas import get_critter, get_all_critters
-from critters.router import check_llm_status
+from critters.ollama_pool import parse_urls
+from critters.router import check_llm_status, get_hedge_stats
 
 
 FLAG_COLORS = {
@@ -58,6 +59,64 @@ def _render_pin_gate():
             st.rerun()
 
 
+def _render_endpoint_status(endpoints: list):
+    """Per-endpoint health, load and throughput for the Ollama pool."""
+    if not endpoints:
+        return
+    up = sum(1 for e in endpoints if e["available"])
+    with st.expander(f"🏠 Ollama endpoints — {up}/{len(endpoints)} up"):
+        for e in endpoints:
+            icon = {True: "✅", False: "❌"}.get(e["available"], "⏳")
+            rate = f"{e['tokens_per_s']} tok/s" if e["tokens_per_s"] is not None else "— tok/s"
+            cooling = ""
+            if e["breaker"] != "closed":
+                icon = "🧊" if e["available"] else icon
+                cooling = f" · breaker {e['breaker'].replace('_', '-')}"
+                if e["breaker_retry_in"]:
+                    cooling += f", retry in {e['breaker_retry_in']}s"
+            model = f" · `{e['model']}`" + (f" (step {e['rung'] + 1} of ladder)" if e["rung"] else "")
+            st.markdown(
+                f"{icon} `{e['url']}`{model} — {e['in_flight']} replying · {e['queued']} waiting · {e['turns']} replies · "
+                f"{rate} · {e['sessions']} sessions · {e['errors']} errors{cooling}"
+            )
+
+
+def _render_tuning_job(job: dict):
+    """Progress and results of the background tuning run (critters.tuning.start_job)."""
+    running = job["running"]
+    label = "⚙️ Tuning for this machine…" if running else "⚙️ Tuning finished"
+    with st.status(label, state="running" if running else "complete", expanded=running):
+        if running and job["current"]:
+            url, model = job["current"]
+            st.progress(job["done"] / job["total"],
+                        text=f"{model} on {url} — trial {job['trials'] + 1} "
+                             f"({job['done']} of {job['total']} models done)")
+        for r in job["results"]:
+            st.success(
+                f"✅ {r['model']} on {r['url']}: {r['num_thread'] or 'auto'} threads, "
+                f"batch {r['num_batch']}, context up to {r['ctx_max']} tokens "
+                f"({r['eval_tps'] or '?'} tokens/s)"
+            )
+        for e in job["errors"]:
+            st.error(f"❌ Could not tune {e['model']} on {e['url']}: {e['error']}")
+        if running:
+            st.button("🔄 Refresh progress", key="tune_refresh")
+
+
+def _render_hedge_stats():
+    """Who won recent hedged turns and how fast, for tuning the hedging deadline."""
+    stats = get_hedge_stats()
+    if not stats["turns"]:
+        return
+    with st.expander(f"🏁 Hedging — {stats['hedged']} of {stats['turns']} recent replies raced Gemini"):
+        winners = " · ".join(f"{name}: {n}" for name, n in sorted(stats["winners"].items()))
+        st.markdown(
+            f"Deadline {stats['hedge_after_s']}s · race started after {stats['hedge_started_p50_s']}s (median) · "
+            f"first word p50 {stats['first_token_p50_s']}s, p95 {stats['first_token_p95_s']}s"
+        )
+        st.markdown(f"Winners — {winners}")
+
+
 def _render_dashboard():
     # Header
     col1, col2 = st.columns([5, 1])
@@ -91,9 +150,13 @@ def _render_dashboard():
     status_text = {
         "ollama": "🏠 Using Local AI (Ollama) — private & offline",
         "gemini": "☁️ Using Cloud AI (Gemini) — Ollama unavailable",
+        "rate_limited": f"⏳ Cloud AI is rate-limited — retrying in {status['gemini']['backoff_secs']}s",
+        "cooling": f"⏳ AI is cooling down after repeated errors — retrying in {status['cooling_secs']}s",
         "none":   "❌ No AI connected — check settings",
     }.get(active, "Unknown")
     st.info(status_text)
+    _render_endpoint_status(status["ollama"].get("endpoints", []))
+    _render_hedge_stats()
 
     # Tabs
     tab_overview, tab_logs, tab_alerts, tab_settings = st.tabs([
@@ -144,7 +207,8 @@ def _render_dashboard():
                         st.markdown(f"🧒 **You:** {msg['content']}{flag_label}")
                     else:
                         st.markdown(f"{c['emoji']} **{c['name']}:** {msg['content']}")
-                    st.markdown(f"<span style='color:#ccc;font-size:0.75rem;'>{msg['timestamp'][:16]}</span>", unsafe_allow_html=True)
+                    served = f" · {msg['model']}" if msg.get("model") else ""
+                    st.markdown(f"<span style='color:#ccc;font-size:0.75rem;'>{msg['timestamp'][:16]}{served}</span>", unsafe_allow_html=True)
                     st.markdown("---")
             else:
                 st.info("No messages in this session.")
@@ -214,7 +278,8 @@ def _render_dashboard():
             ollama_url = st.text_input(
                 "Ollama URL",
                 value=settings.get("ollama_url") or os.getenv("OLLAMA_BASE_URL", "http://172.22.112.1:11434"),
-                help="Change this if Ollama runs on a different machine, e.g. http://192.168.1.10:11434",
+                help="Change this if Ollama runs on a different machine, e.g. http://192.168.1.10:11434. "
+                     "List several, comma-separated, to share the load across boxes.",
                 placeholder="http://localhost:11434",
             )
         with col_model:
@@ -225,20 +290,64 @@ def _render_dashboard():
                 placeholder="llama3:latest",
             )
 
+        local_kinds = ["ollama", "openai"]
+        current_kind = settings.get("local_provider") or os.getenv("LOCAL_LLM_PROVIDER", "ollama")
+        local_kind = st.selectbox(
+            "Local server type",
+            local_kinds,
+            index=local_kinds.index(current_kind) if current_kind in local_kinds else 0,
+            format_func=lambda k: {"ollama": "Ollama", "openai": "OpenAI-compatible (llama.cpp, LM Studio)"}[k],
+            help="What the URLs above run. Warm-up, memory of earlier turns and machine tuning are Ollama-only.",
+        )
+
+        ladder_models = st.text_input(
+            "Smaller models for busy times (optional)",
+            value=settings.get("ollama_model_ladder") or os.getenv("OLLAMA_MODEL_LADDER", ""),
+            help="Comma-separated, biggest first, e.g. llama3.2:3b, llama3.2:1b. When replies get slower "
+                 "than the targets below, the app steps down to the next model, and back up when it's quiet.",
+            placeholder="llama3.2:3b, llama3.2:1b",
+        )
+        col_slo_first, col_slo_speed = st.columns(2)
+        with col_slo_first:
+            slo_first = st.number_input(
+                "Target: first word within (seconds)",
+                min_value=0.5, max_value=60.0, step=0.5,
+                value=float(settings.get("llm_slo_first_token_s") or os.getenv("LLM_SLO_FIRST_TOKEN_S", "3")),
+            )
+        with col_slo_speed:
+            slo_speed = st.number_input(
+                "Target: words per second (tokens/s)",
+                min_value=0.5, max_value=200.0, step=0.5,
+                value=float(settings.get("llm_slo_tokens_per_s") or os.getenv("LLM_SLO_TOKENS_PER_S", "5")),
+            )
+
         # Live connection test
         if st.button("🔌 Test Ollama connection", key="test_ollama"):
             import requests as _req
-            try:
-                r = _req.get(f"{ollama_url.rstrip('/')}/api/tags", timeout=3)
-                if r.status_code == 200:
-                    models = [m["name"] for m in r.json().get("models", [])]
-                    st.success(f"✅ Connected! Models available: {', '.join(models) or 'none pulled yet'}")
-                    if ollama_model not in models:
-                        st.warning(f"⚠️ Model '{ollama_model}' not found. Run: `ollama pull {ollama_model}`")
-                else:
-                    st.error(f"❌ Reachable but returned status {r.status_code}")
-            except Exception as e:
-                st.error(f"❌ Cannot reach {ollama_url} — is Ollama running? (`ollama serve`)")
+            for url in parse_urls(ollama_url):
+                try:
+                    r = _req.get(f"{url}/api/tags", timeout=3)
+                    if r.status_code == 200:
+                        models = [m["name"] for m in r.json().get("models", [])]
+                        st.success(f"✅ {url} connected! Models available: {', '.join(models) or 'none pulled yet'}")
+                        if ollama_model not in models:
+                            st.warning(f"⚠️ Model '{ollama_model}' not found on {url}. Run: `ollama pull {ollama_model}`")
+                    else:
+                        st.error(f"❌ {url} reachable but returned status {r.status_code}")
+                except Exception as e:
+                    st.error(f"❌ Cannot reach {url} — is Ollama running? (`ollama serve`)")
+
+        # Host tuning — slow, so it runs in the background and only on demand
+        from critters import tuning
+        tune_job = tuning.job_status()
+        if st.button("⚙️ Tune for this machine", key="tune_ollama", disabled=bool(tune_job.get("running")),
+                     help="Tries thread and batch settings for each model and saves the fastest. "
+                          "Takes a few minutes; chats may be slow meanwhile."):
+            from critters.router import _get_config
+            tuning.start_job(parse_urls(ollama_url), _get_config()["ollama_models"])
+            tune_job = tuning.job_status()
+        if tune_job:
+            _render_tuning_job(tune_job)
 
         st.markdown("<br>", unsafe_allow_html=True)
         st.markdown("**☁️ Gemini (Cloud fallback)**")
@@ -256,10 +365,23 @@ def _render_dashboard():
             help="Get a free key at https://ai.google.dev — Gemini Flash has a generous free tier",
         )
 
+        hedge_after = st.number_input(
+            "Ask Gemini too if Ollama is silent for (seconds) — 0 = off",
+            min_value=0.0, max_value=60.0, step=0.5,
+            value=float(settings.get("llm_hedge_after_s") or os.getenv("LLM_HEDGE_AFTER_S", "0") or 0),
+            help="Hedging: when a slow local model hasn't started replying by this deadline, "
+                 "a Gemini request races it and whichever answers first is shown. Needs a Gemini key.",
+        )
+
         if st.button("💾 Save AI settings", key="save_ai"):
             set_setting("llm_prefer_local", "1" if prefer_local else "0")
             set_setting("ollama_url",   ollama_url.strip())
             set_setting("ollama_model", ollama_model.strip())
+            set_setting("local_provider", local_kind)
+            set_setting("ollama_model_ladder", ladder_models.strip())
+            set_setting("llm_slo_first_token_s", f"{slo_first:g}")
+            set_setting("llm_slo_tokens_per_s", f"{slo_speed:g}")
+            set_setting("llm_hedge_after_s", f"{hedge_after:g}")
             if gemini_key_input.strip():
                 set_setting("gemini_key", gemini_key_input.strip())
                 st.success("✅ All AI settings saved — changes take effect immediately, no restart needed!")
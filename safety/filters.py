@@ -2,6 +2,18 @@
 Smiling Critters — Safety Filters
 Layer 2 (input) and Layer 3 (output) of the three-layer safety system.
 Layer 1 is the system prompt in personas.py.
+
+Known design constraints
+------------------------
+- Layer 3 runs while the reply streams: OutputScanner clears text for
+  display token by token and stops the turn at the first REDIRECT or CRISIS
+  match, so unsafe text is never shown and generation is cancelled early.
+- Every output pattern ends on a word, so the scanner holds back the
+  trailing partial word (a match can't be decided until the word ends) and
+  rescans OUTPUT_OVERLAP characters of cleared text to catch a phrase split
+  across tokens.  Each token costs a scan of roughly that window, not of the
+  whole reply.  finish() runs check_output() over the full text, so the
+  final verdict is exactly the non-streaming one.
 """
 
 import re
@@ -56,6 +68,10 @@ _redirect_re = re.compile("|".join(_REDIRECT_PATTERNS), re.IGNORECASE)
 _alert_re    = re.compile("|".join(_ALERT_PATTERNS), re.IGNORECASE)
 _crisis_re   = re.compile("|".join(_CRISIS_PATTERNS), re.IGNORECASE)
 
+# Longest stretch of text one output pattern can span, with slack for spacing
+OUTPUT_OVERLAP = 64
+_partial_word_re = re.compile(r"\w*\Z")
+
 
 # ─── Redirect messages (critter-specific tones) ──────────────────────────────
 
@@ -114,8 +130,12 @@ def check_input(text: str, critter_id: str = "bubba") -> SafetyResult:
 
 def check_output(text: str) -> SafetyResult:
     """Screen LLM output before showing to the child."""
+    return _screen_output(text, 0, len(text))
+
+
+def _screen_output(text: str, start: int, end: int) -> SafetyResult:
     # Run same filters on output — belt and suspenders
-    if _crisis_re.search(text):
+    if _crisis_re.search(text, start, end):
         return SafetyResult(
             level=FlagLevel.CRISIS,
             reason="Crisis content in LLM output — replaced",
@@ -123,7 +143,7 @@ def check_output(text: str) -> SafetyResult:
             parent_note="LLM output contained crisis-level content and was blocked."
         )
 
-    if _redirect_re.search(text):
+    if _redirect_re.search(text, start, end):
         return SafetyResult(
             level=FlagLevel.REDIRECT,
             reason="Off-limits content in LLM output — replaced",
@@ -133,6 +153,46 @@ def check_output(text: str) -> SafetyResult:
     return SafetyResult(level=FlagLevel.SAFE)
 
 
+class OutputScanner:
+    """
+    Layer 3 for a streamed reply.  feed() each token and display only
+    ``cleared``; once feed() returns an unsafe result, stop the stream and
+    show its redirect_message.  Call finish() when the stream ends.
+    """
+
+    def __init__(self):
+        self.text    = ""
+        self.checked = 0                        # text[:checked] has been screened
+        self.result: SafetyResult | None = None
+
+    @property
+    def cleared(self) -> str:
+        """The part of the reply that is safe to show so far."""
+        return "" if self.result else self.text[:self.checked]
+
+    def feed(self, token: str) -> SafetyResult | None:
+        """Screen ``token``; the unsafe result on a hit, otherwise None."""
+        if self.result:
+            return self.result
+        self.text += token
+        cut = _partial_word_re.search(self.text, self.checked).start()
+        if cut > self.checked:
+            found = _screen_output(self.text, max(0, self.checked - OUTPUT_OVERLAP), cut)
+            if found.level != FlagLevel.SAFE:
+                self.result = found
+                return found
+            self.checked = cut
+        return None
+
+    def finish(self) -> SafetyResult:
+        """Verdict on the whole reply, including the held-back last word."""
+        if self.result is None:
+            self.result = check_output(self.text)
+            if self.result.level == FlagLevel.SAFE:
+                self.checked = len(self.text)
+        return self.result
+
+
 def wellness_reminder(minutes_elapsed: float, critter_id: str = "bubba") -> str | None:
     """
     Returns a wellness reminder message if appropriate, else None.
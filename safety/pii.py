@@ -0,0 +1,131 @@
+"""
+Smiling Critters — PII Sanitiser
+Strips personal details from messages before they go to a cloud model.
+
+Known design constraints
+------------------------
+- Only cloud calls (Gemini) are sanitised; Ollama traffic stays local.
+- All detectors are alternatives of one precompiled regex, so a message is
+  scanned once and each match is replaced by its kind's placeholder
+  (PLACEHOLDERS).  Earlier alternatives win where two could match at the
+  same position — emails before phone numbers, addresses before names.
+- Covered: emails, UK and US phone numbers, street addresses and UK
+  postcodes, school names ("Oakwood Primary", "St Mary's School") and full
+  names introduced as such ("my name is Emma Jones", "I'm Emma Jones",
+  "Mrs Patel").  Names are only recognised after a cue or title; a bare
+  "Emma Jones" mid-sentence is indistinguishable from any two capitalised
+  words.  The filter leans towards removing: "I love Summer School" loses
+  the school name.
+- After a cue, the name is an optional title plus every following word, in
+  any case ("my dad is Mr. John Smith", "im emma jones"), up to the first
+  function word (_NOT_NAME): "call me on 07700 900123" keeps "on".  The
+  looser cues (I'm, I am, this is) need two name words and skip a first
+  word ending in -ing, so "I'm so happy" and "i'm going home" survive.
+- Results are memoised per message text (LRU, MEMO_SIZE entries), so a turn
+  only scans the newest message; the history is served from the memo.
+- The memo is shared by every session in the process and guarded by _lock.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+MEMO_SIZE = 4096
+
+PLACEHOLDERS = {
+    "email":    "[email removed]",
+    "phone":    "[phone removed]",
+    "address":  "[address removed]",
+    "postcode": "[address removed]",
+    "school":   "[school removed]",
+    "name":     "[name removed]",
+}
+
+# Unambiguous street words match in any case; short or everyday ones ("way",
+# "close", "St") only after capitalised words, so "3 apples on the way" survives
+_STREET       = r"street|road|avenue|lane|drive|crescent|boulevard|terrace|gardens"
+_STREET_TITLE = (r"St|Rd|Ave|Ln|Dr|Close|Way|Court|Ct|Cres|Place|Pl|Blvd|Grove|Gdns|Mews|Hill|Row|"
+                 r"Square|Sq|Parade|Walk")
+_SCHOOL = (r"Primary|Elementary|Middle|High|Junior|Juniors|Infant|Infants|Prep|Preparatory|Grammar|"
+           r"Academy|Montessori|Kindergarten|Nursery|School|College")
+_CAP    = r"[A-Z][a-z'’]+"       # one capitalised word
+_WORD   = r"[A-Za-z'’-]+"
+_TITLE  = r"(?i:mr|mrs|ms|miss|mx|dr)\.?\s+"
+# Words that end a name after a cue: function words and what children say after "I'm"
+_NOT_NAME = (r"a|an|the|and|or|but|so|to|too|of|on|in|at|by|for|from|with|about|as|if|is|am|are|was|"
+             r"not|no|yes|i|im|me|my|you|your|he|she|it|we|they|his|her|our|their|this|that|"
+             r"what|who|how|why|when|where|home|here|there|now|later|today|tonight|tomorrow|"
+             r"yesterday|very|really|just|also|still|only|back|ok|okay|fine|good|happy|sad|sorry|"
+             r"bored|tired|hungry|sick|scared|excited|ready|done|gonna|please|thanks|thank")
+_NAME   = rf"(?!(?i:{_NOT_NAME})\b){_WORD}"
+
+_PII_RE = re.compile(
+    "|".join([
+        r"(?P<email>\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b)",
+        # UK: +44 7700 900123, 07700 900123, (020) 7946 0958, 0161 496 0000
+        r"(?=[+(\d])(?P<phone>(?:\+44[\s-]?(?:\(0\)[\s-]?)?|\(?\b0)\d{2,4}\)?[\s-]?\d{3,4}[\s-]?\d{3,4}\b"
+        # US: (555) 123-4567, 555.123.4567, +1 555 123 4567
+        r"|(?:\+1[\s.-]?)?(?:\(\d{3}\)|\b\d{3})[\s.-]?\d{3}[\s.-]?\d{4}\b)",
+        rf"(?=\d)(?P<address>\b\d{{1,5}}[A-Za-z]?,?\s+(?:{_WORD}\s+){{1,3}}(?i:{_STREET})\b"
+        rf"|\b\d{{1,5}}[A-Za-z]?,?\s+(?:{_CAP}\s+){{1,3}}(?:{_STREET_TITLE})\b\.?)",
+        r"(?=[A-Z])(?P<postcode>\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b)",
+        rf"(?=[A-Z])(?P<school>\b(?:St\.?\s+)?(?:{_CAP}\s+){{1,3}}(?:{_SCHOOL})(?:\s+(?:School|Academy))?\b)",
+        # Cue kept, name replaced: "my name is [name removed]".  The lookahead
+        # on each kind skips positions it can't start at without trying it.
+        rf"(?=[MmIiCcTtDd])(?P<name>(?P<cue>\b(?i:my\s+(?:full\s+|real\s+|last\s+|sur)?name\s+is|i['’]?m\s+called|call\s+me|"
+        rf"my\s+(?:mum|mom|dad|teacher|brother|sister|friend)(?:'s\s+name)?\s+is)\s+)"
+        rf"(?:{_TITLE})?{_NAME}(?:\s+{_NAME})*"
+        rf"|(?P<cue2>\b(?i:i['’]?m|i\s+am|this\s+is)\s+)"
+        rf"(?:{_TITLE}{_NAME}|(?![a-z]+ing\b){_NAME}\s+{_NAME})(?:\s+{_NAME})*"
+        rf"|\b(?:Mr|Mrs|Ms|Miss|Mx|Dr)\.?\s+{_CAP}(?:\s+{_CAP})?\b)",
+    ])
+)
+
+_lock = threading.Lock()
+_memo: "OrderedDict[str, str]" = OrderedDict()
+_hits = 0
+_misses = 0
+
+
+def _replace(m: "re.Match") -> str:
+    kind = m.lastgroup
+    if kind == "name":
+        cue = m.group("cue") or m.group("cue2") or ""
+        return cue + PLACEHOLDERS["name"]
+    return PLACEHOLDERS[kind]
+
+
+def scan(text: str) -> str:
+    """Sanitise ``text`` in one regex pass, without the memo."""
+    return _PII_RE.sub(_replace, text)
+
+
+def sanitise(text: str) -> str:
+    """``text`` with PII replaced by placeholders; memoised per text."""
+    global _hits, _misses
+    if not text:
+        return text
+    with _lock:
+        cached = _memo.get(text)
+        if cached is not None:
+            _memo.move_to_end(text)
+            _hits += 1
+            return cached
+    clean = scan(text)
+    with _lock:
+        _misses += 1
+        _memo[text] = clean
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return clean
+
+
+def sanitise_messages(messages: List[Dict]) -> List[Dict]:
+    """Copy of ``messages`` with every content sanitised."""
+    return [{**m, "content": sanitise(m.get("content", ""))} for m in messages]
+
+
+def stats() -> Dict:
+    with _lock:
+        return {"memo_entries": len(_memo), "hits": _hits, "misses": _misses}
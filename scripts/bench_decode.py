@@ -0,0 +1,178 @@
+"""
+bench_decode.py
+---------------
+Micro-benchmark for the streamed-reply decoder (critters.streamdecode and
+critters.providers) against the previous per-line approach: decode every
+chunk to str, split lines, json.loads each one and walk the dict.
+
+Streams are replayed from memory in network-sized chunks, so only decode
+cost is measured.  Built-in recordings cover Ollama NDJSON, Gemini SSE and
+OpenAI-compatible SSE (llama.cpp); a real capture can be benchmarked too:
+
+    curl -sN http://localhost:11434/api/chat -d '{"model": "llama3.1:8b",
+        "messages": [{"role": "user", "content": "Tell me a story"}]}' > ollama.ndjson
+    python scripts/bench_decode.py --file ollama.ndjson --provider ollama
+
+Usage:
+    python scripts/bench_decode.py [--rounds 200] [--chunk 512]
+"""
+
+import argparse
+import codecs
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))  # allow `python scripts/bench_decode.py`
+
+from critters import providers                       # noqa: E402
+from critters.streamdecode import FrameDecoder      # noqa: E402
+
+WORDS = ("Once upon a time, a little 🐻 bear found a shiny \"magic\" pebble by the river.\n"
+         "She wondered: could it glow? ✨ Let's find out together! ").split(" ")
+
+
+def _tokens(n: int):
+    return [w + " " for w in (WORDS * (n // len(WORDS) + 1))[:n]]
+
+
+def record_ollama(n: int) -> bytes:
+    lines = [json.dumps({"model": "llama3.1:8b", "created_at": "2025-01-01T00:00:00.000000Z",
+                         "message": {"role": "assistant", "content": t}, "done": False},
+                        ensure_ascii=False, separators=(",", ":")) for t in _tokens(n)]
+    lines.append(json.dumps({"model": "llama3.1:8b", "message": {"role": "assistant", "content": ""},
+                             "done": True, "context": list(range(2000)), "eval_count": n,
+                             "eval_duration": 10 ** 9, "prompt_eval_count": 500,
+                             "prompt_eval_duration": 10 ** 8}, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def record_gemini(n: int) -> bytes:
+    toks = _tokens(n)
+    events = []
+    for i in range(0, n, 4):          # Gemini sends a few words per chunk
+        events.append("data: " + json.dumps({
+            "candidates": [{"content": {"parts": [{"text": "".join(toks[i:i + 4])}], "role": "model"},
+                            "index": 0}],
+            "usageMetadata": {"promptTokenCount": 500}, "modelVersion": "gemini-2.0-flash"}))
+    return ("\r\n\r\n".join(events) + "\r\n\r\n").encode("utf-8")
+
+
+def record_openai(n: int) -> bytes:
+    events = ["data: " + json.dumps({"id": "x", "object": "chat.completion.chunk", "choices": [
+        {"index": 0, "delta": {"role": "assistant", "content": None}, "finish_reason": None}]})]
+    events += ["data: " + json.dumps({"id": "x", "object": "chat.completion.chunk", "choices": [
+        {"index": 0, "delta": {"content": t}, "finish_reason": None}]}) for t in _tokens(n)]
+    events.append("data: " + json.dumps({"id": "x", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                                         "timings": {"prompt_n": 500, "prompt_ms": 100.0,
+                                                     "predicted_n": n, "predicted_ms": 1000.0}}))
+    events.append("data: [DONE]")
+    return ("\n\n".join(events) + "\n\n").encode("utf-8")
+
+
+def _legacy_token(name: str, data: dict) -> str:
+    if name == "ollama":
+        return data.get("message", {}).get("content", "") or data.get("response", "")
+    if name == "gemini":
+        parts = data.get("candidates", [{}])[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts)
+    choices = data.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def decode_legacy(name: str, chunks):
+    """The old path: str lines, json.loads on every line."""
+    decoder, pending, out = codecs.getincrementaldecoder("utf-8")(), "", []
+    sse = name != "ollama"
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                continue
+            if sse:
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                line = line[6:]
+            token = _legacy_token(name, json.loads(line))
+            if token:
+                out.append(token)
+    return out
+
+
+def decode_new(name: str, chunks):
+    provider = providers.GEMINI if name == "gemini" else providers.PROVIDERS[name]
+    call = providers.Call("", {}, b"content")
+    decoder, out = FrameDecoder(provider.framing), []
+    for chunk in chunks:
+        for frame in decoder.feed(chunk):
+            token = provider.token(frame, call)
+            if token:
+                out.append(token)
+                continue
+            provider.stats(frame)
+            if provider.is_done(frame):
+                break
+    return out
+
+
+def _chunks(body: bytes, size: int, seed: int = 7):
+    rng, out, i = random.Random(seed), [], 0
+    while i < len(body):
+        step = rng.randint(max(1, size // 4), size)    # uneven, splits UTF-8 and frames
+        out.append(body[i:i + step])
+        i += step
+    return out
+
+
+def bench(name: str, body: bytes, rounds: int, chunk: int) -> dict:
+    chunks = _chunks(body, chunk)
+    old, new = decode_legacy(name, chunks), decode_new(name, chunks)
+    if "".join(old) != "".join(new):
+        raise SystemExit(f"{name}: decoders disagree — fix streamdecode before trusting timings")
+    tokens = len(new)
+    timings = {}
+    for label, fn in (("legacy", decode_legacy), ("streamdecode", decode_new)):
+        best = float("inf")
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            fn(name, chunks)
+            best = min(best, time.perf_counter() - t0)
+        timings[label] = best
+    return {
+        "stream": name,
+        "tokens": tokens,
+        "bytes": len(body),
+        "legacy_us_per_token": timings["legacy"] / tokens * 1e6,
+        "new_us_per_token": timings["streamdecode"] / tokens * 1e6,
+        "speedup": timings["legacy"] / timings["streamdecode"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark streamed-reply decoding.")
+    parser.add_argument("--rounds", type=int, default=200, help="Replays per stream (best time is kept)")
+    parser.add_argument("--chunk", type=int, default=512, help="Largest network chunk in bytes")
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens per built-in recording")
+    parser.add_argument("--file", help="A captured response body to benchmark instead")
+    parser.add_argument("--provider", choices=["ollama", "openai", "gemini"], default="ollama",
+                        help="Wire format of --file")
+    args = parser.parse_args()
+
+    if args.file:
+        streams = [(args.provider, Path(args.file).read_bytes())]
+    else:
+        streams = [("ollama", record_ollama(args.tokens)), ("gemini", record_gemini(args.tokens)),
+                   ("openai", record_openai(args.tokens))]
+
+    print(f"\n🐾 Stream decode cost — best of {args.rounds}, chunks up to {args.chunk} B")
+    print("=" * 68)
+    print(f"  {'Stream':<8} {'Tokens':>7} {'Bytes':>8} {'Legacy µs/tok':>14} {'New µs/tok':>11} {'Speedup':>8}")
+    for name, body in streams:
+        r = bench(name, body, args.rounds, args.chunk)
+        print(f"  {r['stream']:<8} {r['tokens']:>7} {r['bytes']:>8} {r['legacy_us_per_token']:>14.2f} "
+              f"{r['new_us_per_token']:>11.2f} {r['speedup']:>7.1f}x")
+    print()
@@ -0,0 +1,110 @@
+"""
+bench_pii.py
+------------
+Throughput benchmark for the cloud PII sanitiser (safety.pii) on long chat
+histories, against the previous sanitiser (two re.sub calls per message,
+re-run over the whole history every turn).
+
+Each run replays a conversation turn by turn, sanitising the full history
+before every "Gemini call" as the router does, and reports:
+    - cold single-pass scan throughput (MB/s, no memo)
+    - total sanitising time for the conversation, old vs new (memoised)
+
+Usage:
+    python scripts/bench_pii.py [--turns 200] [--rounds 5]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))  # allow `python scripts/bench_pii.py`
+
+from safety import pii    # noqa: E402
+
+CHILD = [
+    "I went to the park today and saw a big dog!",
+    "Why do cats purr when they're happy?",
+    "My name is Emma Jones and I'm 8.",
+    "We live at 42 Oak Tree Road, it has a red door.",
+    "Mrs Patel at Oakwood Primary gave us homework about volcanoes.",
+    "My mum's number is 07700 900123 if you need her.",
+    "Can you tell me a story about a dragon who loves pancakes?",
+    "I'm a bit sad because my friend didn't play with me at lunch.",
+]
+CRITTER = [
+    "Ooh, that sounds like SO much fun! 🐕 What colour was the dog? Did it wag its tail at you?",
+    "Great question! 🐔 Cats purr when they feel safe and cosy — it's like a happy little engine! ✨",
+    "Volcanoes are amazing! 🌋 Deep under the ground, rock gets so hot it melts into magma...",
+    "Oh friend, that sounds really hard 💜 Your feelings are okay. Can you tell me a little more?",
+]
+
+
+def legacy_sanitise(messages):
+    """The previous router implementation, kept verbatim for comparison."""
+    safe = []
+    for m in messages:
+        content = m.get("content", "")
+        content = re.sub(r'\b[\w.+-]+@[\w-]+\.\w+\b', '[email removed]', content)
+        content = re.sub(r'\b\d{3}[-.\ s]?\d{3}[-.\ s]?\d{4}\b', '[phone removed]', content)
+        safe.append({**m, "content": content})
+    return safe
+
+
+def conversation(turns: int, seed: int = 3):
+    rng, history = random.Random(seed), []
+    for i in range(turns):
+        # A turn counter keeps every message unique, like real chat text
+        history.append({"role": "user", "content": f"{rng.choice(CHILD)} ({i})"})
+        history.append({"role": "assistant", "content": f"{rng.choice(CRITTER)} ({i})"})
+    return history
+
+
+def replay(history, sanitise) -> float:
+    """Sanitise the growing history once per turn; return seconds spent."""
+    spent = 0.0
+    for end in range(1, len(history) + 1, 2):
+        t0 = time.perf_counter()
+        sanitise(history[:end])
+        spent += time.perf_counter() - t0
+    return spent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cloud PII sanitiser.")
+    parser.add_argument("--turns", type=int, default=200, help="Child turns in the conversation")
+    parser.add_argument("--rounds", type=int, default=5, help="Repeats (best time is kept)")
+    args = parser.parse_args()
+
+    history = conversation(args.turns)
+    text = "\n".join(m["content"] for m in history)
+    size_mb = len(text.encode("utf-8")) / 1e6
+
+    scan_s = min(_timed(lambda: [pii.scan(m["content"]) for m in history]) for _ in range(args.rounds))
+    old_s = min(replay(history, legacy_sanitise) for _ in range(args.rounds))
+    new_s = []
+    for _ in range(args.rounds):
+        pii._memo.clear()               # every round starts cold, as a new process would
+        new_s.append(replay(history, pii.sanitise_messages))
+    new_s = min(new_s)
+
+    print(f"\n🐾 PII sanitiser — {args.turns} turns, {len(history)} messages, {size_mb * 1000:.0f} KB of history")
+    print("=" * 64)
+    print(f"  Single pass, no memo:     {size_mb / scan_s:8.1f} MB/s   ({scan_s * 1000:.2f} ms for the history)")
+    print(f"  Whole chat, old (2 regex, rescans history every turn): {old_s * 1000:8.1f} ms")
+    print(f"  Whole chat, new (6 kinds, newest message only):       {new_s * 1000:8.1f} ms")
+    print(f"  Average per turn:     old {old_s / args.turns * 1000:.3f} ms → new {new_s / args.turns * 1000:.3f} ms")
+    print()
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    main()
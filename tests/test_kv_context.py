@@ -0,0 +1,121 @@
+"""
+KV-context reuse against an in-process fake Ollama: the first turn seeds a
+context with the turn roles intact, later turns reuse it, and a session that
+loses it (invalidated, or cut by the sentence budget) continues on /api/chat.
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+PORT = _free_port()
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("GEMINI_API_KEY", "")
+
+REPLY = "Hello there, friend. "
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    calls = []
+    reply = REPLY
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = json.dumps({"models": [{"name": "llama3.1:8b", "size": 4_000_000_000}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        FakeOllama.calls.append((self.path, payload))
+        lines = [{"message": {"content": w + " "}, "response": w + " ", "done": False} for w in FakeOllama.reply.split()]
+        lines.append({"done": True, "context": [len(FakeOllama.calls)], "eval_count": len(lines),
+                      "eval_duration": 10 ** 8, "prompt_eval_count": 10, "prompt_eval_duration": 10 ** 7})
+        body = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = ThreadingHTTPServer(("127.0.0.1", PORT), FakeOllama)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+from critters import kv_context, router          # noqa: E402
+from db.queries import init_db, set_setting       # noqa: E402
+
+init_db()
+set_setting("llm_response_cache", "0")
+
+
+def _turn(session_id, history, text):
+    history.append({"role": "user", "content": text})
+    reply = "".join(router.get_llm_response("You are Bubba.", list(history), True, "bubba", session_id))
+    history.append({"role": "assistant", "content": reply})
+    return FakeOllama.calls[-1]
+
+
+def test_context_reused_on_second_turn():
+    history = []
+    path, first = _turn("s-reuse", history, "hi")
+    assert path == "/api/generate" and "context" not in first and first["system"]
+    path, second = _turn("s-reuse", history, "how are you?")
+    assert path == "/api/generate" and second["context"] and second["prompt"] == "how are you?"
+
+
+def test_seeded_first_turn_keeps_roles():
+    history = []
+    path, seed = _turn("s-roles", history, "hi")
+    assert path == "/api/generate"
+    assert seed["system"] == "You are Bubba." and seed["prompt"] == "hi" and "context" not in seed
+
+
+def test_invalidated_session_uses_chat_with_roles():
+    history = []
+    _turn("s-chat", history, "hi")
+    _turn("s-chat", history, "tell me about owls")
+    kv_context.invalidate("s-chat")
+
+    path, turn = _turn("s-chat", history, "and bats?")
+    assert path == "/api/chat"
+    assert [m["role"] for m in turn["messages"]] == ["system", "user", "assistant", "user", "assistant", "user"]
+    assert turn["messages"][0]["content"] == "You are Bubba."
+    assert turn["messages"][-1]["content"] == "and bats?"
+
+
+def test_cut_reply_is_not_reused():
+    history = []
+    _turn("s-cut", history, "hi")
+    FakeOllama.reply = "One. Two is here. Three is here. Four is here. Five is here. Six is here."
+    calls = len(FakeOllama.calls)
+    try:
+        _turn("s-cut", history, "count for me")
+    finally:
+        FakeOllama.reply = REPLY
+    assert len(FakeOllama.calls) == calls + 1     # the cut sends nothing extra
+    assert history[-1]["content"].rstrip() == "One. Two is here. Three is here. Four is here."
+
+    path, after = _turn("s-cut", history, "again")
+    assert path == "/api/chat" and "context" not in after
+    assert after["messages"][-2]["content"].rstrip() == "One. Two is here. Three is here. Four is here."
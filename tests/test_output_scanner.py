@@ -0,0 +1,68 @@
+"""
+Layer-3 streaming output check: phrases split across tokens are caught, a
+partial last word is held back from display, and finish() gives the same
+verdict as check_output() on the whole reply.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from safety.filters import FlagLevel, OutputScanner, check_output   # noqa: E402
+
+
+def _feed(tokens):
+    scanner = OutputScanner()
+    shown = []
+    for token in tokens:
+        if scanner.feed(token):
+            break
+        shown.append(scanner.cleared)
+    return scanner, shown
+
+
+def test_phrase_split_across_tokens_is_caught():
+    scanner, shown = _feed(["Sometimes I", " want", " to", " d", "ie", " today", " and", " more"])
+    assert scanner.result is not None and scanner.result.level == FlagLevel.CRISIS
+    assert not any("die" in text for text in shown)
+    assert scanner.cleared == ""
+
+
+def test_phrase_across_many_cleared_tokens_uses_the_overlap():
+    filler = ["Tell", " me", " and", " I", " will"] + [" really"] * 10
+    scanner, shown = _feed(filler + [" hurt", " my", "self", " now"])
+    assert scanner.result.level == FlagLevel.CRISIS
+    assert not any("myself" in text for text in shown)
+
+
+def test_partial_word_is_held_back():
+    scanner = OutputScanner()
+    assert scanner.feed("I chewed a gu") is None
+    assert scanner.cleared == "I chewed a "          # "gu" could still become "gun"
+    assert scanner.feed("m") is None
+    assert scanner.cleared == "I chewed a "
+    assert scanner.feed(" today.") is None
+    assert scanner.cleared == "I chewed a gum today."
+
+
+def test_partial_word_that_completes_unsafe_is_never_shown():
+    scanner = OutputScanner()
+    assert scanner.feed("Look, a gu") is None
+    result = scanner.feed("n!")
+    assert result is not None and result.level == FlagLevel.REDIRECT
+    assert scanner.cleared == ""
+
+
+@pytest.mark.parametrize("tokens", [
+    ["What a lovely", " day for", " a picnic!"],
+    ["That is a gu", "n"],                            # unsafe word only complete at the end
+    ["I don't want", " to be here"],
+    ["Elephants are", " big and", " kind", " 🐘"],
+    ["No", " ghost attack", "s here"],
+])
+def test_finish_matches_check_output(tokens):
+    scanner, _ = _feed(tokens)
+    assert scanner.finish().level == check_output("".join(tokens)).level
@@ -0,0 +1,42 @@
+"""
+Name detection in the cloud PII sanitiser: a cue takes an optional title and
+every name word after it, in any case, and stops at function words.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from safety.pii import scan   # noqa: E402
+
+NAME  = "[name removed]"
+PHONE = "[phone removed]"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("my dad is Mr. John Smith", f"my dad is {NAME}"),
+    ("my teacher is Mr. Brown", f"my teacher is {NAME}"),
+    ("my name is emma jones", f"my name is {NAME}"),
+    ("im emma jones", f"im {NAME}"),
+    ("I'm Emma Jones", f"I'm {NAME}"),
+    ("my mum is mrs patel", f"my mum is {NAME}"),
+    ("Mrs Patel is nice", f"{NAME} is nice"),
+    ("my name is Emma and I like cats", f"my name is {NAME} and I like cats"),
+    ("call me on 07700 900123", f"call me on {PHONE}"),
+])
+def test_names_after_a_cue_are_removed_whole(text, expected):
+    assert scan(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "i'm at home",
+    "i'm going to the park",
+    "I'm so happy",
+    "I am happy today",
+    "this is my mum",
+])
+def test_function_words_are_not_names(text):
+    assert scan(text) == text
@@ -0,0 +1,50 @@
+"""
+Single-flight cancellation: a plain disconnect keeps the generation alive for
+GRACE_S so a rerun can reattach; a safety stop cancels it at once.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from critters import singleflight   # noqa: E402
+
+
+def _run(close_meta):
+    closed = []
+
+    async def slow(meta):
+        try:
+            for i in range(1000):
+                yield f"t{i} "
+                await asyncio.sleep(0.01)
+        finally:
+            closed.append(asyncio.get_running_loop().time())
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        key = f"k-{id(close_meta)}"
+        leader = singleflight.join(key, slow, close_meta)
+        follower = singleflight.join(key, slow, {})
+        await anext(leader)
+        await anext(follower)
+        closed_at = loop.time()
+        await leader.aclose()
+        await asyncio.sleep(0.2)
+        await follower.aclose()
+        await asyncio.sleep(0.1)
+        return list(closed), closed_at
+
+    return asyncio.run(scenario())
+
+
+def test_safety_stop_cancels_at_once():
+    closed, closed_at = _run({"stop": "safety"})
+    assert closed and closed[0] - closed_at < 0.1
+
+
+def test_plain_disconnect_keeps_the_grace():
+    closed, _ = _run({})
+    assert not closed     # follower left 0.2 s later; the grace hasn't run out
@@ -1,14 +1,40 @@
 """
 Smiling Critters — Ollama Setup Checker
 Run directly to diagnose connection issues:
-    python utils/ollama_check.py
+    python utils/ollama_check.py [url] [model]
+
+Check every endpoint of a pool (comma-separated, as in OLLAMA_BASE_URL):
+    python utils/ollama_check.py http://box1:11434,http://box2:11434
+
+Measure persona prompt sizes (shared prefix vs persona suffix) in tokens:
+    python utils/ollama_check.py --prompt-tokens
+
+Calibrate num_thread / num_batch / context ceiling for this machine and save
+them for the router (slow: every trial reloads the model):
+    python utils/ollama_check.py --tune
+
+Benchmark every pulled model (or just [model]) on a fixed persona suite, as a
+table and optionally as JSON for comparing runs and machines.  --cold also
+times a cold load, which UNLOADS the model first — don't use it on a server
+children are chatting with:
+    python utils/ollama_check.py --bench [--cold] [--json bench.json]
 """
 
+import argparse
+import hashlib
+import json
 import os
+import platform
 import sys
+import time
+import uuid
+from pathlib import Path
+
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).parent.parent))  # allow `python utils/ollama_check.py`
+
 load_dotenv()
 
 
@@ -47,6 +73,252 @@ def check_ollama(url: str = None, model: str = None) -> dict:
     return result
 
 
+def check_pool(urls: str = None, model: str = None) -> list:
+    """check_ollama() for each endpoint in a comma-separated URL list."""
+    from critters.ollama_pool import parse_urls
+
+    raw = urls or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    return [check_ollama(url, model) for url in parse_urls(raw)]
+
+
+def count_tokens(url: str, model: str, text: str) -> int:
+    """Token count of ``text`` for ``model``, measured by Ollama itself.
+
+    Ollama has no tokenize endpoint, so this reads prompt_eval_count from a
+    one-token raw generation.  A random nonce leads the prompt so nothing is
+    served from the KV cache, and the nonce's own count is subtracted
+    (±1 token at the join).
+    """
+    def _eval(prompt: str) -> int:
+        r = requests.post(
+            f"{url}/api/generate",
+            json={"model": model, "prompt": prompt, "raw": True, "stream": False,
+                  "options": {"num_predict": 1}},
+            timeout=120,
+        )
+        r.raise_for_status()
+        return int(r.json().get("prompt_eval_count", 0))
+
+    nonce = f"[{uuid.uuid4().hex}]\n"
+    return max(0, _eval(nonce + text) - _eval(f"[{uuid.uuid4().hex}]\n"))
+
+
+def measure_prompt_tokens(url: str, model: str) -> list:
+    """Per-critter token counts for the shared prompt prefix and persona suffix."""
+    from critters.personas import SHARED_PREFIX, get_all_critters
+
+    prefix_tokens = count_tokens(url, model, SHARED_PREFIX)
+    rows = []
+    for c in get_all_critters():
+        suffix_tokens = count_tokens(url, model, c["persona_prompt"])
+        rows.append({
+            "critter":       c["id"],
+            "prefix_tokens": prefix_tokens,
+            "suffix_tokens": suffix_tokens,
+            "total_tokens":  prefix_tokens + suffix_tokens,
+        })
+    return rows
+
+
+def print_prompt_tokens(rows: list, model: str):
+    print(f"\n🐾 Persona prompt sizes — {model}")
+    print("=" * 52)
+    print(f"  {'Critter':<10} {'Shared prefix':>14} {'Persona':>9} {'Total':>7}")
+    for r in rows:
+        print(f"  {r['critter']:<10} {r['prefix_tokens']:>14} {r['suffix_tokens']:>9} {r['total_tokens']:>7}")
+    if rows:
+        share = rows[0]["prefix_tokens"] / max(1, sum(r["total_tokens"] for r in rows) / len(rows))
+        print(f"\n  Shared prefix is ~{share:.0%} of an average prompt and is reused across critters.")
+    print()
+
+
+def tune(url: str, models: list) -> list:
+    """Calibrate each of ``models`` on ``url``, print the trials and save the winners."""
+    from critters import tuning
+
+    saved = []
+    for model in models:
+        print(f"\n🐾 Tuning {model} on {url}")
+        print("=" * 52)
+        print(f"  {'Threads':>7} {'Batch':>6} {'Prompt tok/s':>13} {'Gen tok/s':>10} {'Turn (s)':>9}")
+
+        def _row(t: dict):
+            print(f"  {str(t.get('num_thread') or 'auto'):>7} {t['num_batch']:>6} "
+                  f"{str(t['prompt_tps'] or '–'):>13} {str(t['eval_tps'] or '–'):>10} {t['turn_s']:>9}")
+
+        try:
+            result = tuning.calibrate(url, model, on_trial=_row)
+        except Exception as e:
+            print(f"  ❌ Calibration failed: {e}")
+            continue
+        tuning.save(url, model, result)
+        saved.append(result)
+        print(f"\n  ✅ Saved: num_thread={result['num_thread'] or 'auto'}, "
+              f"num_batch={result['num_batch']}, num_ctx up to {result['ctx_max']}")
+    print()
+    return saved
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+# Fixed so results compare across runs and machines: bump BENCH_SUITE_VERSION
+# whenever the suite or options below change.
+
+BENCH_SUITE_VERSION = 1
+BENCH_MESSAGES = [
+    "Hi! What's your favourite thing to do?",
+    "Why is the sky blue?",
+    "I'm sad because my friend didn't want to play with me today.",
+]
+BENCH_OPTIONS = {"temperature": 0, "seed": 42, "num_predict": 96, "num_ctx": 2048}
+
+
+def _cold_load(url: str, model: str) -> float:
+    """Unload ``model``, then time loading it with an empty prompt (s)."""
+    requests.post(f"{url}/api/generate", json={"model": model, "keep_alive": 0}, timeout=60)
+    started = time.perf_counter()
+    r = requests.post(f"{url}/api/generate",
+                      json={"model": model, "prompt": "", "stream": False,
+                            "options": {"num_ctx": BENCH_OPTIONS["num_ctx"]}},
+                      timeout=600)
+    r.raise_for_status()
+    return time.perf_counter() - started
+
+
+def _bench_turn(url: str, model: str, system_prompt: str, message: str) -> dict:
+    """One streamed /api/chat turn, timed on the client and by Ollama."""
+    # A fresh nonce ahead of the prompt so every turn pays full prompt-eval
+    nonce = f"[{uuid.uuid4().hex}]\n"
+    started = time.perf_counter()
+    first = None
+    final: dict = {}
+    with requests.post(
+        f"{url}/api/chat",
+        json={"model": model, "stream": True, "options": BENCH_OPTIONS,
+              "messages": [{"role": "system", "content": nonce + system_prompt},
+                           {"role": "user", "content": message}]},
+        stream=True, timeout=(5, 300),
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if first is None and data.get("message", {}).get("content"):
+                first = time.perf_counter() - started
+            if data.get("done"):
+                final = data
+                break
+    total = time.perf_counter() - started
+    prompt_s = (final.get("prompt_eval_duration") or 0) / 1e9
+    eval_s   = (final.get("eval_duration") or 0) / 1e9
+    return {
+        "ttft_s":     first,
+        "turn_s":     total,
+        "prompt_tps": (final.get("prompt_eval_count") or 0) / prompt_s if prompt_s else None,
+        "eval_tps":   (final.get("eval_count") or 0) / eval_s if eval_s else None,
+        "tokens":     final.get("eval_count") or 0,
+    }
+
+
+def bench_model(url: str, model: str, cold: bool = False) -> dict:
+    """The full persona suite for ``model`` (after a cold load if ``cold``), summarised."""
+    from critters.personas import get_all_critters
+    from critters.telemetry import percentile
+
+    row = {"model": model, "turns": 0, "errors": 0, "cold_load_s": None}
+    if cold:
+        try:
+            row["cold_load_s"] = _cold_load(url, model)
+        except Exception as e:
+            row["error"] = f"cold load failed: {e}"
+            return row
+    turns = []
+    for critter in get_all_critters():
+        for message in BENCH_MESSAGES:
+            try:
+                turns.append(_bench_turn(url, model, critter["system_prompt"], message))
+            except Exception as e:
+                row["errors"] += 1
+                row["error"] = str(e)
+
+    def _pct(values: list, pct: float):
+        return percentile(values, pct) if values else None
+
+    def _median(key):
+        return _pct([t[key] for t in turns if t[key] is not None], 50)
+
+    latencies = [t["turn_s"] for t in turns]
+    row.update({
+        "turns":          len(turns),
+        "prompt_tps":     _median("prompt_tps"),
+        "ttft_p50_s":     _median("ttft_s"),
+        "eval_tps":       _median("eval_tps"),
+        "turn_p50_s":     _pct(latencies, 50),
+        "turn_p95_s":     _pct(latencies, 95),
+        "tokens_per_turn": _median("tokens"),
+    })
+    return row
+
+
+def _bench_models(url: str) -> list:
+    r = requests.get(f"{url}/api/tags", timeout=5)
+    r.raise_for_status()
+    # Embedding models can't chat
+    return sorted(m["name"] for m in r.json().get("models", []) if "embed" not in m["name"])
+
+
+def run_bench(url: str, models: list = None, cold: bool = False) -> dict:
+    """Benchmark ``models`` (default: every pulled model) on ``url``; ``cold`` unloads each first."""
+    from critters import tuning
+    from critters.personas import get_all_critters
+
+    suite = json.dumps([BENCH_MESSAGES, BENCH_OPTIONS,
+                        [c["system_prompt"] for c in get_all_critters()]], sort_keys=True)
+    host = tuning.probe_host() if tuning.is_local(url) else None
+    try:
+        version = requests.get(f"{url}/api/version", timeout=3).json().get("version")
+    except Exception:
+        version = None
+    report = {
+        "suite_version": BENCH_SUITE_VERSION,
+        "suite_hash":    hashlib.sha256(suite.encode("utf-8")).hexdigest()[:12],
+        "started_at":    time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "url":           url,
+        "ollama_version": version,
+        "host": {
+            "platform":      platform.platform(),
+            "machine":       platform.machine(),
+            "cores":         host.cores if host else None,
+            "mem_available": host.mem_available if host else None,
+        },
+        "options": BENCH_OPTIONS,
+        "cold":    cold,
+        "models":  [],
+    }
+    for model in models or _bench_models(url):
+        print(f"  ⏱️  {model}…", flush=True)
+        report["models"].append(bench_model(url, model, cold))
+    return report
+
+
+def print_bench(report: dict):
+    def _f(value, digits=2):
+        return "–" if value is None else f"{value:.{digits}f}"
+
+    print(f"\n🐾 Model benchmark — {report['url']} (suite v{report['suite_version']}, {report['suite_hash']})")
+    print("=" * 96)
+    print(f"  {'Model':<24} {'Cold load':>9} {'Prompt t/s':>11} {'TTFT p50':>9} "
+          f"{'Gen t/s':>8} {'Turn p50':>9} {'Turn p95':>9} {'Turns':>6}")
+    for r in report["models"]:
+        print(f"  {r['model']:<24} {_f(r['cold_load_s']):>9} {_f(r.get('prompt_tps'), 1):>11} "
+              f"{_f(r.get('ttft_p50_s')):>9} {_f(r.get('eval_tps'), 1):>8} {_f(r.get('turn_p50_s')):>9} "
+              f"{_f(r.get('turn_p95_s')):>9} {r['turns']:>6}")
+        if r.get("error"):
+            print(f"    ⚠️  {r['errors']} failed — last error: {r['error']}")
+    print("\n  Times in seconds. Prompt and generation rates are Ollama's own; TTFT and turns are wall-clock.")
+    print()
+
+
 def print_report(result: dict):
     print("\n🐾 Smiling Critters — Ollama Connection Report")
     print("=" * 52)
@@ -80,10 +352,66 @@ def print_report(result: dict):
     print()
 
 
+def print_pool_summary(results: list):
+    ready = [r for r in results if r["reachable"] and r["model_found"]]
+    print(f"🐾 Pool summary — {len(ready)}/{len(results)} endpoints ready")
+    print("=" * 52)
+    for r in results:
+        ok = r["reachable"] and r["model_found"]
+        detail = "ready" if ok else (r["error"] or f"model '{r['model']}' missing")
+        print(f"  {'✅' if ok else '❌'} {r['url']:<32} {detail}")
+    print()
+
+
 if __name__ == "__main__":
-    # Optional: pass URL as argument
-    url   = sys.argv[1] if len(sys.argv) > 1 else None
-    model = sys.argv[2] if len(sys.argv) > 2 else None
-    result = check_ollama(url, model)
-    print_report(result)
-    sys.exit(0 if result["reachable"] and result["model_found"] else 1)
+    parser = argparse.ArgumentParser(description="Diagnose the Ollama connection.")
+    parser.add_argument("url", nargs="?",
+                        help="Ollama base URL, or a comma-separated pool (default: OLLAMA_BASE_URL)")
+    parser.add_argument("model", nargs="?", help="Model name (default: OLLAMA_MODEL)")
+    parser.add_argument("--prompt-tokens", action="store_true",
+                        help="Measure shared-prefix / persona token counts for every critter")
+    parser.add_argument("--tune", action="store_true",
+                        help="Calibrate and save Ollama options for every ladder model on each endpoint")
+    parser.add_argument("--bench", action="store_true",
+                        help="Benchmark every pulled model (or just [model]) on a fixed persona suite")
+    parser.add_argument("--cold", action="store_true",
+                        help="With --bench, unload each model and time a cold load (disrupts live chats)")
+    parser.add_argument("--json", metavar="PATH",
+                        help="With --bench, also write the results as JSON ('-' for stdout; "
+                             "everything else then goes to stderr)")
+    args = parser.parse_args()
+
+    json_out = sys.stdout
+    if args.json == "-":
+        sys.stdout = sys.stderr   # reports, progress and tables: stdout carries only the JSON
+
+    results = check_pool(args.url, args.model)
+    for result in results:
+        print_report(result)
+    if len(results) > 1:
+        print_pool_summary(results)
+    ready = [r for r in results if r["reachable"] and r["model_found"]]
+    if ready and args.prompt_tokens:
+        print_prompt_tokens(measure_prompt_tokens(ready[0]["url"], ready[0]["model"]), ready[0]["model"])
+    if args.bench:
+        # Benchmarks every pulled model, so it only needs the endpoint up
+        reachable = [r for r in results if r["reachable"]]
+        if args.cold and reachable:
+            print("  ⚠️  --cold unloads every benchmarked model; chats on these servers will stall while it reloads.\n")
+        reports = []
+        for r in reachable:
+            reports.append(run_bench(r["url"], [args.model] if args.model else None, args.cold))
+            print_bench(reports[-1])
+        # One JSON list for all endpoints, so the output stays a single valid document
+        if args.json == "-":
+            print(json.dumps(reports, indent=2), file=json_out)
+        elif args.json:
+            with open(args.json, "w") as f:
+                json.dump(reports, f, indent=2)
+            print(f"  📄 Results written to {args.json}\n")
+    if ready and args.tune:
+        from critters.router import _get_config
+        models = [args.model] if args.model else _get_config()["ollama_models"]
+        for r in ready:
+            tune(r["url"], models)
+    sys.exit(0 if results and len(ready) == len(results) else 1)